@@ -1,5 +1,11 @@
 from flight_paths import findAirportCoordinatesByIATACode
+from flight_log import readFlightLog
+from path_model import fitPathModel, nearestPoints, pathLength
 from scipy.stats import gaussian_kde
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse import csr_matrix
+from sklearn.neighbors import NearestNeighbors
+from joblib import Parallel, delayed
 from sklearn.cluster import DBSCAN
 import matplotlib.pyplot as plt
 import pandas as pd
@@ -10,7 +16,7 @@ import math
 import csv
 import os
 
-#This file takes flight data collected on an airport and runs it through a clustring algorithm to find the most common flight paths.  The top clusters have a polynomial regression line fitted to them.
+#This file takes flight data collected on an airport and runs it through a clustring algorithm to find the most common flight paths.  The top clusters have a path model fitted to them.
 
 #function: converts distance_miles into degrees based on the latitude given
 #parameters: distance_miles - float, latitude - float
@@ -59,96 +65,203 @@ def displayClusterData(cluster_dfs, iataCode):
         os.makedirs(f'data/flightData/maps/clusters/{iataCode}', exist_ok=True) #create a new directory
         map.save(f'data/flightData/maps/clusters/{iataCode}/cluster_{cluster_num}_map.html') #save the map
 
-#function: sort the data provided into clusters using DBSCAN
+#function: reads the flight data of an airport
 #parameters: iataCode - string
-#returns: flight data with column specifying cluster, and dictionary of cluster name and size
-def createClusters(iataCode):
-    data_path = f"data/flightData/data/flight_log_{iataCode}.csv" 
-
-    eps_miles = 0.125 #epsilon is the distance between points that DBSCAN looks for another point in order to provide a classification of either noise, non-core, or core points. 
-    minPts = 5 #minimum points to form a cluster
-
-    eps = miles_to_degrees(eps_miles, findAirportCoordinatesByIATACode(iataCode)[0]) #given the inputed epsilon value in miles, convert into degrees at the latitude of the specified airport
-    
-    flight_data = pd.read_csv(data_path) #read flight data
-    flight_data['timestamp'] = pd.to_datetime(flight_data['timestamp']) #make sure the timestamp is in datetime format
-
-    arriving_flight_data = flight_data[flight_data['arr_iata'] == iataCode] #filter arriving flights
-    departing_flight_data = flight_data[flight_data['dep_iata'] == iataCode] #filter departing flights
-
-    arriving_coordinates = arriving_flight_data[['lat', 'lng']] #get coordinate values for arriving flights
-    departing_coordinates = departing_flight_data[['lat', 'lng']] #get coordinate values for departing flights
-
-    arriving_dbscan = DBSCAN(eps=eps, min_samples=minPts) #initialize arriving DBSCAN with parameters
-    arriving_dbscan.fit(arriving_coordinates) #fit arriving DBSCAN to my data
-
-    departing_dbscan = DBSCAN(eps=eps, min_samples=minPts) #initialize departing DBSCAN with parameters
-    departing_dbscan.fit(departing_coordinates) #fit departing DBSCAN to my data
+#returns: flight data with an airport column
+def loadFlightData(iataCode):
+    flight_data = readFlightLog(iataCode) #read flight data with the compact schema
+    flight_data['airport'] = pd.Categorical.from_codes(np.zeros(len(flight_data), dtype=np.int8), categories=[iataCode]) #airport of every row, stored as one category
+    return flight_data
+
+#function: gets the positions of the arriving and departing flights in the flight data
+#parameters: flight_data - Pandas DataFrame, iataCode - string
+#returns: tuple with arrays of arriving and departing row positions
+def directionPositions(flight_data, iataCode):
+    arriving = (flight_data['arr_iata'] == iataCode).to_numpy() #arriving flights
+    departing = (flight_data['dep_iata'] == iataCode).to_numpy() & ~arriving #departing flights, flights that return to the airport count as arriving
+    return (np.flatnonzero(arriving), np.flatnonzero(departing))
+
+#function: runs DBSCAN on the arriving and departing flights separately and gives every point one cluster label
+#parameters: coordinates - array of (latitude, longitude) rows, arriving_positions - array, departing_positions - array, eps - float, minPts - int
+#returns: tuple with the array of cluster labels, -1 for noise, and dictionary of cluster name and size
+def clusterLabels(coordinates, arriving_positions, departing_positions, eps, minPts):
+    arriving_coordinates = coordinates[arriving_positions] #get coordinate values for arriving flights
+    departing_coordinates = coordinates[departing_positions] #get coordinate values for departing flights
+
+    cluster_labels = np.full(len(coordinates), -1, dtype=np.int32) #flights that are in neither direction are noise
+
+    if len(arriving_coordinates): #if there are arriving flights
+        arriving_dbscan = DBSCAN(eps=eps, min_samples=minPts) #initialize arriving DBSCAN with parameters
+        arriving_dbscan.fit(arriving_coordinates) #fit arriving DBSCAN to my data
+        cluster_labels[arriving_positions] = arriving_dbscan.labels_ #add the arriving dbscan labels
+
+    if len(departing_coordinates): #if there are departing flights
+        departing_dbscan = DBSCAN(eps=eps, min_samples=minPts) #initialize departing DBSCAN with parameters
+        departing_dbscan.fit(departing_coordinates) #fit departing DBSCAN to my data
+        num_arriving_clusters = cluster_labels.max() + 1 #number of arriving clusters
+        cluster_labels[departing_positions] = np.where(departing_dbscan.labels_ != -1, departing_dbscan.labels_ + num_arriving_clusters, -1) #add the departing dbscan labels, changed to not overlap with arriving dbscan labels
 
     #DBSCAN takes 2 arguments: eps and min_samples
     #eps(ε) is the distance between points that DBSCAN looks for another point 
     #min_samples is the minimum number of points that DBSCAN looks for to form a cluster
     #using these variable and a list of coordinate, DBSCAN will provide a classification of either noise, non-core, or core points.
 
-    arriving_cluster_labels = arriving_dbscan.labels_ #get all the arriving dbscan labels
-    departing_cluster_labels = [label + (len(np.unique(arriving_cluster_labels))-1) if label != -1 else label for label in departing_dbscan.labels_] #get all the departing dbscan labels and change them to not overlap with arriving dbscan labels
+    label_counts = np.bincount(cluster_labels[cluster_labels != -1]) #count the points in each cluster
+    cluster_sizes = {label: size for label, size in enumerate(label_counts) if size > 0} #calculate the size of each cluster
+    return (cluster_labels, cluster_sizes)
 
-    arriving_flight_data['cluster'] = arriving_cluster_labels #add the cluster labels to the arriving dataframe
-    departing_flight_data['cluster'] = departing_cluster_labels #add the cluster labels to the departing dataframe
+#function: sort the data provided into clusters using DBSCAN
+#parameters: iataCode - string, eps_miles - float, minPts - int, flight_data - Pandas DataFrame, read from the log if None
+#returns: flight data with column specifying cluster, and dictionary of cluster name and size
+#the 'cluster' column is written into the flight_data that is passed in rather than a copy, so the log is only held in memory once
+def createClusters(iataCode, eps_miles=0.125, minPts=5, flight_data=None):
+    #eps_miles is the distance between points that DBSCAN looks for another point in order to provide a classification of either noise, non-core, or core points. 
+    #minPts is the minimum points to form a cluster
 
-    flight_data = pd.concat([arriving_flight_data, departing_flight_data]) #concatenate the data together
+    eps = miles_to_degrees(eps_miles, findAirportCoordinatesByIATACode(iataCode)[0]) #given the inputed epsilon value in miles, convert into degrees at the latitude of the specified airport
 
-    unique_labels = list(set(arriving_cluster_labels) | set(departing_cluster_labels)) #get all unique labels
-    num_clusters = len(unique_labels) - 1 #get the total number of clusters
+    if flight_data is None: #if no flight data was given
+        flight_data = loadFlightData(iataCode) #read flight data
+    arriving_positions, departing_positions = directionPositions(flight_data, iataCode) #rows of arriving and departing flights
 
-    cluster_labels = flight_data['cluster'].to_list() #get a list of cluster labels
+    coordinates = flight_data[['lat', 'lng']].to_numpy() #get coordinate values for all flights
+    cluster_labels, cluster_sizes = clusterLabels(coordinates, arriving_positions, departing_positions, eps, minPts) #cluster each direction
 
-    cluster_sizes = {label: np.sum(cluster_labels == label) for label in unique_labels if label != -1} #calculate the size of each cluster
+    flight_data['cluster'] = cluster_labels #add the cluster labels to the one shared dataframe
+    num_clusters = len(cluster_sizes) #get the total number of clusters
 
     print(f"Number of clusters: {num_clusters}") #print out total number of clusters
     for label, size in cluster_sizes.items(): #for all clusters
-        if label != -1: #if they are not noise
-            print(f"Cluster {label}: {size} points") #print out the cluster and its corresponding size
-        else: #if they are noise
-            print(f"Noise: {size} points") #print out the noise and its corresponding size
+        print(f"Cluster {label}: {size} points") #print out the cluster and its corresponding size
 
     # visualizeClusters(flight_data) #visualize the clusters
 
     return (flight_data, cluster_sizes)
 
-#function: get the paths used in these clusters
-#parameters: iataCode - string
-#returns: dictionary containing slope, y-intercept, and 4 coordinate bounding lines
-def getPaths(iataCode):
-    flight_data, cluster_sizes = createClusters(iataCode) #create the clusters and get the flight data and cluster data
-
+#function: keeps only the edges of a neighbor graph that are within eps, without each point's edge to itself
+#parameters: graph - sparse distance matrix, eps - float
+#returns: sparse boolean matrix of the neighbors of every point
+def neighborsWithin(graph, eps):
+    rows = np.repeat(np.arange(graph.shape[0]), np.diff(graph.indptr)) #row of every edge
+    keep = (graph.data <= eps) & (graph.indices != rows) #edges within eps that join two different points
+    return csr_matrix((np.ones(np.count_nonzero(keep), dtype=bool), (rows[keep], graph.indices[keep])), shape=graph.shape)
+
+#function: labels clusters the way DBSCAN does, from the neighbors of every point within eps
+#parameters: neighbors - sparse boolean matrix, minPts - int
+#returns: array of cluster labels, -1 for noise
+def clusterNeighborGraph(neighbors, minPts):
+    labels = np.full(neighbors.shape[0], -1) #every point starts as noise
+    core = np.diff(neighbors.indptr) + 1 >= minPts #core points have at least minPts points within eps, counting themselves
+    core_positions = np.flatnonzero(core)
+    if len(core_positions) == 0: #if there are no core points every point is noise
+        return labels
+
+    _, components = connected_components(neighbors[core_positions][:, core_positions], directed=False) #core points that are neighbors share a cluster
+    _, first_core = np.unique(components, return_index=True) #first core point of each cluster
+    order = np.empty(len(first_core), dtype=int)
+    order[np.argsort(first_core)] = np.arange(len(first_core)) #number clusters by their first core point, like DBSCAN
+    labels[core_positions] = order[components]
+
+    border = neighbors[~core][:, core_positions] #core neighbors of every point that is not core
+    border_positions = np.flatnonzero(~core)[np.diff(border.indptr) > 0] #points next to at least one core point
+    if len(border_positions): #DBSCAN gives a border point the first cluster that reaches it, which is the lowest numbered one
+        starts = border.indptr[:-1][np.diff(border.indptr) > 0]
+        labels[border_positions] = np.minimum.reduceat(labels[core_positions][border.indices], starts)
+    return labels
+
+#function: summarizes the clustering of one eps and minPts pair
+#parameters: eps_miles - float, minPts - int, arriving_labels - array, departing_labels - array, top_n - int
+#returns: dictionary with the cluster count, noise fraction, and largest cluster sizes
+def summarizeClustering(eps_miles, minPts, arriving_labels, departing_labels, top_n=5):
+    cluster_sizes = []
+    for labels in (arriving_labels, departing_labels): #arriving and departing clusters are labeled separately
+        cluster_sizes += list(np.bincount(labels[labels != -1])) #count the points in each cluster
+    cluster_sizes.sort(reverse=True) #largest clusters first
+
+    num_points = len(arriving_labels) + len(departing_labels) #total number of points
+    num_noise = np.sum(arriving_labels == -1) + np.sum(departing_labels == -1) #total number of noise points
+
+    return {
+        'eps_miles': eps_miles,
+        'minPts': minPts,
+        'num_clusters': len(cluster_sizes),
+        'noise_fraction': num_noise / num_points if num_points else 0.0,
+        'top_cluster_sizes': [int(size) for size in cluster_sizes[:top_n]]
+    }
+
+#function: clusters arriving and departing flights for one eps and every minPts value
+#parameters: graphs - list of sparse distance matrices, airport_latitude - float, eps_miles - float, minPts_values - list
+#returns: list of dictionaries of cluster statistics, one for each minPts
+def clusterEps(graphs, airport_latitude, eps_miles, minPts_values):
+    eps = miles_to_degrees(eps_miles, airport_latitude) #convert eps to degrees
+    neighbors = [neighborsWithin(graph, eps) for graph in graphs] #neighbors within eps are found once and shared by every minPts
+    results = []
+    for minPts in minPts_values: #for each minPts
+        arriving_labels, departing_labels = (clusterNeighborGraph(direction_neighbors, minPts) for direction_neighbors in neighbors)
+        results.append(summarizeClustering(eps_miles, minPts, arriving_labels, departing_labels))
+    return results
+
+#function: clusters the flight data for a grid of eps and minPts values from one neighbor graph computed at the largest eps, without running DBSCAN for each pair
+#parameters: iataCode - string, eps_values_miles - list, minPts_values - list, n_jobs - int
+#returns: DataFrame with one row of cluster statistics for each eps and minPts pair
+def sweepClusters(iataCode, eps_values_miles=(0.05, 0.075, 0.1, 0.125, 0.15, 0.2), minPts_values=(3, 5, 10, 20), n_jobs=-1):
+    airport_latitude = findAirportCoordinatesByIATACode(iataCode)[0] #get the latitude of the airport
+    max_eps = miles_to_degrees(max(eps_values_miles), airport_latitude) #largest eps in degrees
+
+    flight_data = loadFlightData(iataCode) #read flight data
+    all_coordinates = flight_data[['lat', 'lng']].to_numpy() #get coordinate values for all flights
+
+    graphs = [] #neighbor graphs of arriving and departing flights
+    for positions in directionPositions(flight_data, iataCode): #for arriving and departing flights
+        coordinates = all_coordinates[positions] #get their coordinates
+        if len(coordinates) == 0: #if there are no flights
+            graphs.append(csr_matrix((0, 0)))
+            continue
+        neighbors = NearestNeighbors(radius=max_eps).fit(coordinates) #index the coordinates
+        graphs.append(neighbors.radius_neighbors_graph(coordinates, mode='distance')) #distances to all neighbors within the largest eps
+
+    results = Parallel(n_jobs=n_jobs, prefer='threads')(delayed(clusterEps)(graphs, airport_latitude, eps_miles, minPts_values) for eps_miles in eps_values_miles) #run every eps in parallel, threads share the graphs without copying
+
+    return pd.DataFrame([result for eps_results in results for result in eps_results]) #return one row per pair
+
+#function: picks the labels of the largest clusters, which are the clusters that get a path
+#parameters: cluster_sizes - dictionary, min_cluster_size - int
+#returns: list of cluster labels, largest first
+def topClusterLabels(cluster_sizes, min_cluster_size=100):
     sorted_clusters = sorted(cluster_sizes.items(), key=lambda item: item[1], reverse=True) #sort the clusters based on size
 
     top_cluster_dict = {cluster: size for cluster, size in sorted_clusters[:2]} #add the top two clusters to the dictionary
     
-    top_cluster_dict.update({cluster: size for cluster, size in sorted_clusters[2:] if size >= 100}) #filter out all remainin clusters that have less than 100 points
-
-    top_clusters = list(top_cluster_dict.keys()) #make a list of the remaining clusters
-    top_cluster_flight_data = flight_data[flight_data['cluster'].isin(top_clusters)] #filter out all data not present in the top clusters
-    top_cluster_flight_data["airport"] = iataCode
-
-
-    cluster_dfs = [] #create a new list to store individual cluster flight data
-
-    for cluster in top_clusters: #for each cluster
-        new_cluster_df = top_cluster_flight_data[top_cluster_flight_data['cluster'] == cluster].reset_index(drop=True) #filter out data that does not belong to this cluster
-        cluster_dfs.append(new_cluster_df) #append the cluster data to a list of cluster dataframes
-    
-    print(cluster_dfs)
-
-    displayClusterData(cluster_dfs, iataCode)
-
-    flight_paths = [] #create a new list to store information about the lines
-
-    for cluster_df in cluster_dfs:
-        X = np.array(cluster_df['lng']) #extract longitude in the form of a 2D array
-        y = np.array(cluster_df['lat']) #extract latitude in the form of a 1D array
-
+    top_cluster_dict.update({cluster: size for cluster, size in sorted_clusters[2:] if size >= min_cluster_size}) #filter out all remainin clusters that have less than min_cluster_size points
+
+    return list(top_cluster_dict.keys()) #make a list of the remaining clusters
+
+#function: picks the largest clusters and splits their flight data by cluster
+#parameters: flight_data - Pandas DataFrame, cluster_sizes - dictionary, min_cluster_size - int
+#returns: list of flight data for each top cluster
+#each top cluster gets its own small dataframe on purpose, since every path keeps its cluster's rows for fitting, scoring spots, and maps, and only the top cluster rows are copied, not the whole log
+def getTopClusters(flight_data, cluster_sizes, min_cluster_size=100):
+    top_clusters = topClusterLabels(cluster_sizes, min_cluster_size) #labels of the clusters that get a path
+    cluster_labels = flight_data['cluster'].to_numpy() #cluster of every row
+
+    return [clusterFrame(flight_data, np.flatnonzero(cluster_labels == cluster), cluster) for cluster in top_clusters] #take only the rows of each cluster from the shared dataframe
+
+#function: takes the rows of one cluster from the shared flight data
+#parameters: flight_data - Pandas DataFrame, positions - array of row positions, cluster - int
+#returns: flight data of the cluster
+def clusterFrame(flight_data, positions, cluster):
+    cluster_df = flight_data.iloc[positions].reset_index(drop=True) #rows of the cluster
+    cluster_df['cluster'] = np.int32(cluster) #label the rows, the shared dataframe may not have labels for these rows
+    return cluster_df
+
+#function: fits a path model to the flight data of a cluster
+#parameters: cluster_df - Pandas DataFrame, density_weighting - bool, model - string
+#returns: dictionary containing the path model, bounds, and the cluster data
+def fitPath(cluster_df, density_weighting=True, model='spline'):
+    X = np.array(cluster_df['lng']) #extract longitude in the form of a 2D array
+    y = np.array(cluster_df['lat']) #extract latitude in the form of a 1D array
+
+    if density_weighting: #if the densest points should count the most
         xy = np.vstack([X, y]) #stack arrays in sequence by row
         z = gaussian_kde(xy)(xy) #peform kernel density estimate on data
 
@@ -158,47 +271,156 @@ def getPaths(iataCode):
         X_filtered = X[high_density_indices] #filter out X data
         y_filtered = y[high_density_indices] #filter out y data
         weights_filtered = z[high_density_indices] / max(z[high_density_indices])  #normalize the weights
+    else: #if every point should count the same
+        X_filtered, y_filtered, weights_filtered = X, y, None
+
+    path_model = fitPathModel(y_filtered, X_filtered, weights_filtered, model=model) #fit the centerline of the path
 
-        degree = 20 #specify degree of polynomial line
+    # centerline = path_model['centerline']
+    # plt.scatter(X, y, s=50, label='Data Points') #create a scatter plot with all the data
+    # plt.plot(centerline[:, 1], centerline[:, 0], color='red', label='Path Model')
+    # plt.title(f'Cluster: {cluster_df.iloc[0]["cluster"]}')
+    # plt.xlabel('Longitude') #label longitude
+    # plt.ylabel('Latitude') #label latitude
+    # plt.legend() #create a legend
+    # plt.show() #show the plot
 
-        coefficients = np.polyfit(X_filtered, y_filtered, degree, w=weights_filtered) #get coefficients from filtered data
+    print(f"Path Model: {model}, {len(path_model['centerline'])} centerline points, {pathLength(path_model):.2f} miles long")
 
-        poly = np.poly1d(coefficients) #create polynomial function from coefficients
+    new_path_dict = {
+        'model': path_model,
+        'max_lat': np.max(path_model['centerline'][:, 0]), 
+        'max_long': np.max(path_model['centerline'][:, 1]), 
+        'min_lat': np.min(path_model['centerline'][:, 0]), 
+        'min_long': np.min(path_model['centerline'][:, 1]),
+        'cluster': cluster_df
+    }
 
-        X_curve = np.linspace(min(X_filtered), max(X_filtered), 100) #generate x values along curve for plotting
-        y_curve = poly(X_curve) #generate corresponding y values
+    print(new_path_dict)
 
-        # plt.scatter(X, y, c=z, s=50, label='Data Points') #create a scatter plot with all the data
-        # plt.plot(X_curve, y_curve, color='red', label='Polynomial Regression')
-        # plt.title(f'Cluster: {cluster_df.iloc[0]["cluster"]}')
-        # plt.xlabel('Longitude') #label longitude
-        # plt.ylabel('Latitude') #label latitude
-        # plt.legend() #create a legend
-        # plt.show() #show the plot
+    return new_path_dict
 
-        # Print the polynomial regression equation
-        equation = f'Latitude = {coefficients[-1]:.2f} '  # Intercept term
-        for i in range(degree, 0, -1):
-            equation += f'+ {coefficients[i]:.2f} * Longitude^{i} '
-        print(f"Polynomial Regression Equation: {equation}")
+#function: get the paths used in these clusters
+#parameters: iataCode - string, model - string
+#returns: list of dictionaries containing the path model, 4 coordinate bounding lines, and the cluster data
+def getPaths(iataCode, model='spline'):
+    flight_data, cluster_sizes = createClusters(iataCode) #create the clusters and get the flight data and cluster data
 
-        new_path_dict = {
-            'coefficients': coefficients,
-            'max_lat': np.max(y_curve), 
-            'max_long': np.max(X_curve), 
-            'min_lat': np.min(y_curve), 
-            'min_long': np.min(X_curve),
-            'cluster': cluster_df
-        }
+    cluster_dfs = getTopClusters(flight_data, cluster_sizes) #get the flight data of the top clusters
+    
+    print(cluster_dfs)
 
-        print(new_path_dict)
+    displayClusterData(cluster_dfs, iataCode)
 
-        flight_paths.append(new_path_dict) #append it to the list of paths
+    flight_paths = [fitPath(cluster_df, model=model) for cluster_df in cluster_dfs] #fit a line to each cluster
 
     return flight_paths #return the list of path
 
+#function: takes a sample of the flight data that keeps the same share of every time period and direction
+#parameters: flight_data - Pandas DataFrame, iataCode - string, sample_fraction - float, n_time_bins - int, seed - int
+#returns: sorted array of sampled row positions
+def stratifiedSample(flight_data, iataCode, sample_fraction, n_time_bins=10, seed=0):
+    rng = np.random.default_rng(seed) #random number generator
+    timestamps = flight_data['timestamp'].to_numpy() #time of every row
+    samples = []
+    for positions in directionPositions(flight_data, iataCode): #sample arriving and departing flights separately
+        if len(positions) == 0: #if there are no flights in this direction
+            continue
+        ordered = positions[np.argsort(timestamps[positions], kind='stable')] #flights in time order
+        for time_bin in np.array_split(ordered, min(n_time_bins, len(ordered))): #split the flights into equally sized time periods
+            samples.append(rng.choice(time_bin, size=int(round(len(time_bin) * sample_fraction)), replace=False)) #sample the same fraction from every period
+    return np.sort(np.concatenate(samples)) if samples else np.array([], dtype=int)
+
+#function: assigns points to the nearest top cluster point within eps
+#parameters: points - array of (latitude, longitude) rows, member_points - array of (latitude, longitude) rows, member_labels - array, top_clusters - list, eps - float
+#returns: array of cluster labels, -1 where no top cluster is close enough
+def assignToClusters(points, member_points, member_labels, top_clusters, eps):
+    labels = np.full(len(points), -1) #start with every point unassigned
+    in_top = np.isin(member_labels, top_clusters) #points in the top clusters
+    if not in_top.any() or len(points) == 0: #if there is nothing to assign
+        return labels
+
+    neighbors = NearestNeighbors(n_neighbors=1).fit(member_points[in_top]) #index the top cluster points
+    distances, indices = neighbors.kneighbors(points) #find the closest top cluster point
+    near = distances[:, 0] <= eps #points close enough to join a cluster
+    labels[near] = member_labels[in_top][indices[near, 0]] #give them the cluster of their closest point
+    return labels
+
+#function: clusters a sample and assigns the held out points to its top clusters
+#parameters: iataCode - string, flight_data - Pandas DataFrame, sample_positions - array, holdout_positions - array, sample_fraction - float, eps - float
+#returns: tuple with top cluster data of the sample and the cluster labels of the held out points
+def clusterSample(iataCode, flight_data, sample_positions, holdout_positions, sample_fraction, eps):
+    coordinates = flight_data[['lat', 'lng']].to_numpy() #coordinates of every row
+    directions = directionPositions(flight_data, iataCode) #rows of arriving and departing flights
+    sample_directions = [np.flatnonzero(np.isin(sample_positions, positions)) for positions in directions] #sample rows of each direction
+
+    sample_eps = eps / sample_fraction #flight tracks are close to lines, so neighbors only grow with distance along the track and eps has to widen by the full fraction to keep the same expected number of neighbors
+    sample_labels, cluster_sizes = clusterLabels(coordinates[sample_positions], *sample_directions, sample_eps, 5) #cluster the sample without copying its rows
+    top_clusters = topClusterLabels(cluster_sizes, min_cluster_size=100 * sample_fraction) #top clusters of the sample
+    cluster_dfs = [clusterFrame(flight_data, sample_positions[sample_labels == cluster], cluster) for cluster in top_clusters] #rows of each top cluster
+
+    holdout_labels = np.full(len(holdout_positions), -1) #cluster of every held out row
+    for positions, sample_direction in zip(directions, sample_directions): #only join clusters of the same direction
+        holdout_direction = np.flatnonzero(np.isin(holdout_positions, positions)) #held out rows of this direction
+        holdout_labels[holdout_direction] = assignToClusters(coordinates[holdout_positions[holdout_direction]], coordinates[sample_positions[sample_direction]], sample_labels[sample_direction], top_clusters, eps)
+    return (cluster_dfs, holdout_labels)
+
+#function: gets approximate paths from a stratified sample of the flight data, along with measures of how much the preview can be trusted
+#parameters: iataCode - string, sample_fraction - float, seed - int, compare_full - bool, also clusters all the data to report how many paths a full run would find
+#returns: tuple with the list of paths and a dictionary of confidence measures
+def getPathsPreview(iataCode, sample_fraction=0.2, seed=0, compare_full=False):
+    eps = miles_to_degrees(0.125, findAirportCoordinatesByIATACode(iataCode)[0]) #same eps as createClusters
+    flight_data = loadFlightData(iataCode) #read flight data
+    sample_positions = stratifiedSample(flight_data, iataCode, sample_fraction, seed=seed) #the sample the preview is fitted on
+    holdout_positions = np.setdiff1d(np.concatenate(directionPositions(flight_data, iataCode)), sample_positions) #points left out of the sample
+
+    cluster_dfs, holdout_labels = clusterSample(iataCode, flight_data, sample_positions, holdout_positions, sample_fraction, eps) #cluster the sample and assign the held out points
+    flight_paths = [fitPath(cluster_df) for cluster_df in cluster_dfs] #fit a line to each sample cluster
+
+    second_sample_positions = stratifiedSample(flight_data, iataCode, sample_fraction, seed=seed + 1) #a second sample to check stability
+    _, second_holdout_labels = clusterSample(iataCode, flight_data, second_sample_positions, holdout_positions, sample_fraction, eps)
+
+    cluster_stability = {}
+    curve_deviation_miles = {}
+    for path in flight_paths: #for each preview path
+        cluster = int(path['cluster'].iloc[0]['cluster']) #plain int so the confidence measures can be sent as JSON
+        members = holdout_labels == cluster #held out points that joined this cluster
+
+        second_clusters = np.unique(second_holdout_labels[members]) #clusters of the second sample sharing those points
+        cluster_stability[cluster] = max((np.sum(members & (second_holdout_labels == other)) / np.sum(members | (second_holdout_labels == other)) for other in second_clusters[second_clusters != -1]), default=0.0) #best overlap with a cluster of the second sample
+
+        holdout_members = flight_data.iloc[holdout_positions[members]] #held out points of this cluster
+        if len(holdout_members) == 0: #if no held out points joined
+            curve_deviation_miles[cluster] = float('nan')
+            continue
+        reference_members = holdout_members.iloc[::max(1, len(holdout_members) // len(path['cluster']))] #evenly spread held out points, about as many as the sample has, so the reference costs about as much as the preview fit however large the log is
+        reference_path = fitPath(pd.concat([path['cluster'], reference_members])) #fit the same way as the preview with more of the cluster's points, so only the sampling differs
+        holdout_coordinates = holdout_members[['lat', 'lng']].to_numpy() #coordinates of the held out points
+        holdout_coordinates = holdout_coordinates[::max(1, len(holdout_coordinates) // 500)] #about 500 evenly spread points are enough for an average
+        _, preview_points, _ = nearestPoints(path['model'], holdout_coordinates) #closest points on the preview line to the held out points
+        curve_deviation_miles[cluster] = float(np.mean(nearestPoints(reference_path['model'], preview_points)[0])) #average distance from those points to the reference line
+
+    confidence = {
+        'sample_fraction': sample_fraction,
+        'sample_size': len(sample_positions),
+        'holdout_size': len(holdout_positions),
+        'num_paths': len(flight_paths),
+        'cluster_stability': cluster_stability,
+        'mean_stability': float(np.mean(list(cluster_stability.values()))) if cluster_stability else 0.0,
+        'curve_deviation_miles': curve_deviation_miles,
+        'max_curve_deviation_miles': float(np.nanmax(list(curve_deviation_miles.values()))) if curve_deviation_miles else float('nan')
+    }
+    if compare_full: #clustering all the data costs about as much as a full run, so it is only done when asked for
+        _, full_cluster_sizes = clusterLabels(flight_data[['lat', 'lng']].to_numpy(), *directionPositions(flight_data, iataCode), eps, 5) #cluster all the data, without fitting paths
+        confidence['full_num_paths'] = len(topClusterLabels(full_cluster_sizes))
+    print(f"Preview confidence: {confidence}")
+
+    return (flight_paths, confidence)
+
 if __name__ == "__main__":  
     flight_paths = getPaths("BOS")
+    # print(sweepClusters("BOS").to_string()) #compare eps and minPts values
+    # flight_paths, confidence = getPathsPreview("BOS") #quick look at the paths from a sample
     # print(flight_paths)
 
 
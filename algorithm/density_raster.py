@@ -0,0 +1,206 @@
+from flight_log import readFlightLogFrom, flightLogSize
+from matplotlib import colormaps
+from PIL import Image
+import numpy as np
+import shutil
+import json
+import math
+import os
+
+#This file bins the flight log of an airport into density grids of how many planes were seen in each pixel of the web map, and saves them as heatmap tiles that can be overlaid on a map.
+
+density_dir = "data/flightData/density" #directory the density grids and tiles are saved in
+base_zoom = 14 #zoom level the counts are stored at, every coarser zoom is made by adding up pixels
+tile_size = 256 #pixels on each side of a map tile
+altitude_bands = ((0, 1000), (1000, 2500), (2500, 5000)) #altitude bands in feet, each band includes its lower bound
+tile_zooms = (9, 10, 11, 12, 13) #zoom levels heatmap tiles are drawn at
+
+#function: converts coordinates into pixel positions on the web map at a zoom level
+#parameters: lats - array, lngs - array, zoom - int
+#returns: tuple with x and y pixel arrays
+def toPixels(lats, lngs, zoom):
+    world_size = tile_size * 2**zoom #width of the whole map in pixels
+    lat_radians = np.radians(np.clip(np.asarray(lats, dtype=np.float64), -85.0511, 85.0511)) #web maps stop at about 85 degrees
+    x = (np.asarray(lngs, dtype=np.float64) + 180) / 360 * world_size #longitude is linear
+    y = (1 - np.log(np.tan(lat_radians) + 1 / np.cos(lat_radians)) / math.pi) / 2 * world_size #mercator projection of latitude
+    return (np.clip(x, 0, world_size - 1).astype(np.uint32), np.clip(y, 0, world_size - 1).astype(np.uint32))
+
+#function: gets the rows of the flight data that belong in each density layer
+#parameters: flight_data - DataFrame, iataCode - string
+#returns: dictionary of layer name to boolean array of rows
+def layerMasks(flight_data, iataCode):
+    arriving = (flight_data['arr_iata'] == iataCode).to_numpy() #arriving flights
+    departing = (flight_data['dep_iata'] == iataCode).to_numpy() & ~arriving #departing flights, flights that return to the airport count as arriving
+    altitudes = flight_data['alt'].to_numpy()
+
+    directions = {'all': np.ones(len(flight_data), dtype=bool), 'arriving': arriving, 'departing': departing}
+    bands = {'all': np.ones(len(flight_data), dtype=bool)}
+    for low, high in altitude_bands: #for each altitude band
+        bands[f'alt{low}-{high}'] = (altitudes >= low) & (altitudes < high) #rows in the band
+
+    masks = {}
+    for direction, direction_mask in directions.items(): #every direction
+        for band, band_mask in bands.items(): #with every altitude band
+            masks[f'{direction}_{band}'] = direction_mask & band_mask
+    return masks
+
+#function: adds up the counts of points that fall in the same pixel
+#parameters: x - array, y - array, counts - array
+#returns: tuple with x, y, and count arrays with one entry for each pixel
+def sumPixels(x, y, counts):
+    keys = (x.astype(np.uint64) << np.uint64(32)) | y.astype(np.uint64) #one key for each pixel
+    unique_keys, inverse = np.unique(keys, return_inverse=True) #pixels with points
+    summed = np.bincount(inverse, weights=counts, minlength=len(unique_keys)).astype(np.uint32) #add up the counts of each pixel
+    return ((unique_keys >> np.uint64(32)).astype(np.uint32), (unique_keys & np.uint64(0xffffffff)).astype(np.uint32), summed)
+
+#function: adds two sets of pixel counts together
+#parameters: first - tuple with x, y, and count arrays, second - tuple with x, y, and count arrays
+#returns: tuple with x, y, and count arrays
+def mergeCounts(first, second):
+    return sumPixels(*(np.concatenate([first_array, second_array]) for first_array, second_array in zip(first, second)))
+
+#function: bins flight data into pixel counts for every layer at the base zoom
+#parameters: flight_data - DataFrame, iataCode - string
+#returns: dictionary of layer name to tuple with x, y, and count arrays
+def binFlightData(flight_data, iataCode):
+    x, y = toPixels(flight_data['lat'].to_numpy(), flight_data['lng'].to_numpy(), base_zoom) #pixel of every row
+    return {layer: sumPixels(x[mask], y[mask], np.ones(np.count_nonzero(mask))) for layer, mask in layerMasks(flight_data, iataCode).items()}
+
+#function: gets the file the density grids of an airport are saved in
+#parameters: iataCode - string
+#returns: file name
+def densityFile(iataCode):
+    return f"{density_dir}/density_{iataCode}.npz"
+
+#function: loads the density grids of an airport
+#parameters: iataCode - string
+#returns: tuple with the byte offset of the log already counted and a dictionary of layer name to tuple with x, y, and count arrays
+def loadDensity(iataCode):
+    if not os.path.exists(densityFile(iataCode)): #if nothing has been counted yet
+        return (0, {})
+
+    with np.load(densityFile(iataCode)) as data: #open the saved grids
+        if 'offset' not in data.files: #grids saved before byte offsets were stored have to be counted again
+            return (0, {})
+        layers = {name[:-len('_x')]: (data[name], data[name[:-len('_x')] + '_y'], data[name[:-len('_x')] + '_count']) for name in data.files if name.endswith('_x')}
+        return (int(data['offset']), layers)
+
+#function: saves the density grids of an airport
+#parameters: iataCode - string, offset - int, layers - dictionary
+#returns: nothing
+def saveDensity(iataCode, offset, layers):
+    os.makedirs(density_dir, exist_ok=True) #make sure the directory exists
+    arrays = {'offset': np.array(offset)} #byte offset of the log counted so far
+    for layer, (x, y, counts) in layers.items(): #for each layer
+        arrays[f'{layer}_x'] = x
+        arrays[f'{layer}_y'] = y
+        arrays[f'{layer}_count'] = counts
+    with open(densityFile(iataCode) + '.tmp', 'wb') as file: #write to a temporary file so a crash can not leave half saved grids
+        np.savez(file, **arrays) #save every layer in one file, uncompressed since it is saved after every poll
+    os.replace(densityFile(iataCode) + '.tmp', densityFile(iataCode))
+
+#function: adds the flight log rows that have not been counted yet to the density grids of an airport and redraws the tiles they touch
+#parameters: iataCode - string, zooms - list
+#returns: number of new rows counted
+def updateDensity(iataCode, zooms=tile_zooms):
+    if flightLogSize(iataCode) == 0: #if there is no log yet
+        return 0
+    offset, layers = loadDensity(iataCode) #load the grids counted so far
+    recount = offset == 0 or flightLogSize(iataCode) < offset #the log is counted from the start, or it was replaced by a new log
+    if recount: #start the grids over
+        offset, layers = 0, {}
+
+    new_flight_data, new_offset = readFlightLogFrom(iataCode, offset) #read only the rows after the offset
+    if len(new_flight_data) == 0: #if there are no new rows
+        return 0
+
+    new_layers = binFlightData(new_flight_data, iataCode) #count the new rows
+    for layer, new_counts in new_layers.items(): #for each layer
+        layers[layer] = mergeCounts(layers[layer], new_counts) if layer in layers else new_counts #add the new counts
+    saveDensity(iataCode, new_offset, layers) #save the updated grids
+
+    for layer, new_counts in new_layers.items(): #for each layer
+        for zoom in zooms: #for each zoom
+            renderTiles(iataCode, layer, zoom, tiles=None if recount else touchedTiles(new_counts, zoom), layers=layers) #redraw only the tiles with new traffic, or every tile after a recount
+    return len(new_flight_data)
+
+#function: adds up the base zoom counts of a layer into a coarser zoom
+#parameters: counts - tuple with x, y, and count arrays, zoom - int
+#returns: tuple with x, y, and count arrays at the zoom
+def countsAtZoom(counts, zoom):
+    if zoom > base_zoom: #counts are not stored finer than the base zoom
+        raise ValueError(f"Zoom {zoom} is finer than the base zoom {base_zoom}")
+    shift = np.uint32(base_zoom - zoom) #each zoom level out halves the pixels on each side
+    x, y, values = counts
+    return sumPixels(x >> shift, y >> shift, values)
+
+#function: gets the tiles that a set of pixel counts falls in
+#parameters: counts - tuple with x, y, and count arrays at the base zoom, zoom - int
+#returns: array of tile keys
+def touchedTiles(counts, zoom):
+    x, y, _ = countsAtZoom(counts, zoom) #pixels at this zoom
+    return np.unique((x // tile_size).astype(np.uint64) << np.uint64(32) | (y // tile_size).astype(np.uint64)) #one key for each tile
+
+#function: gets the directory the tiles of a layer at a zoom level are saved in
+#parameters: iataCode - string, layer - string, zoom - int
+#returns: directory name
+def tileDir(iataCode, layer, zoom):
+    return f"{density_dir}/tiles/{iataCode}/{layer}/{zoom}"
+
+#function: draws the heatmap tiles of a layer at a zoom level
+#parameters: iataCode - string, layer - string, zoom - int, colormap - string, tiles - array of tile keys to redraw or None for every tile, layers - dictionary of loaded grids or None to load them
+#returns: number of tiles saved
+def renderTiles(iataCode, layer='all_all', zoom=11, colormap='inferno', tiles=None, layers=None):
+    if layers is None: #if the grids were not passed in
+        _, layers = loadDensity(iataCode) #load the grids
+    if layer not in layers or len(layers[layer][0]) == 0: #if the layer has no points
+        return 0
+
+    x, y, counts = countsAtZoom(layers[layer], zoom) #counts at this zoom
+    scale = 2**int(np.ceil(np.log2(counts.max()))) #count the colors are scaled to, rounded up to a power of two so the colors of old tiles only change when the busiest pixel doubles
+
+    scale_file = f"{tileDir(iataCode, layer, zoom)}/scale.json" #scale the saved tiles were drawn with
+    saved_scale = None
+    if os.path.exists(scale_file): #if tiles were drawn before
+        with open(scale_file, 'r') as file:
+            saved_scale = json.load(file)
+    if saved_scale != scale: #if the colors of every tile changed, or no tiles were drawn yet
+        tiles = None
+    if tiles is None: #if every tile is redrawn
+        shutil.rmtree(tileDir(iataCode, layer, zoom), ignore_errors=True) #remove old tiles so areas without traffic are not left on the map
+    os.makedirs(tileDir(iataCode, layer, zoom), exist_ok=True)
+
+    intensity = np.log1p(counts) / np.log1p(scale) #log scale so quiet areas still show
+    colors = (colormaps[colormap](intensity) * 255).astype(np.uint8) #color of each pixel
+    colors[:, 3] = (np.sqrt(intensity) * 220).astype(np.uint8) #more traffic is more opaque
+
+    tile_x, tile_y = x // tile_size, y // tile_size #tile of each pixel
+    tile_keys = tile_x.astype(np.uint64) << np.uint64(32) | tile_y.astype(np.uint64) #one key for each tile
+    redraw = np.unique(tile_keys) if tiles is None else np.intersect1d(np.unique(tile_keys), tiles) #tiles to draw
+    for tile_key in redraw: #for each tile
+        in_tile = tile_keys == tile_key
+        image = np.zeros((tile_size, tile_size, 4), dtype=np.uint8) #transparent tile
+        image[y[in_tile] % tile_size, x[in_tile] % tile_size] = colors[in_tile] #color the pixels with traffic
+
+        column_dir = f"{tileDir(iataCode, layer, zoom)}/{int(tile_key >> np.uint64(32))}" #tiles are saved as z/x/y.png
+        os.makedirs(column_dir, exist_ok=True)
+        Image.fromarray(image, 'RGBA').save(f"{column_dir}/{int(tile_key & np.uint64(0xffffffff))}.png") #save the tile
+
+    with open(scale_file, 'w') as file: #remember the scale the tiles were drawn with
+        json.dump(scale, file)
+    return len(redraw)
+
+#function: draws every heatmap tile of every layer at several zoom levels, replacing the old tiles
+#parameters: iataCode - string, zooms - list
+#returns: nothing
+def renderAllTiles(iataCode, zooms=tile_zooms):
+    _, layers = loadDensity(iataCode) #load the grids
+    for layer in layers: #for each layer
+        for zoom in zooms: #for each zoom
+            renderTiles(iataCode, layer, zoom, layers=layers) #draw the tiles
+
+
+if __name__ == "__main__":
+    iataCode = 'SAN'
+    updateDensity(iataCode) #count any rows of the log that have not been counted yet, which also draws their tiles
+    renderAllTiles(iataCode) #redraw every tile
@@ -1,6 +1,8 @@
 from flight_paths import findAirportCoordinatesByIATACode
+from density_raster import updateDensity, renderTiles, tileDir, tile_zooms
 import pandas as pd
 import folium
+import os
 
 #This file is used to display the data collected from the flights
 
@@ -26,6 +28,27 @@ def displayData(iataCode):
         
     map.save(f'data/flightData/maps/map_{iataCode}.html') #save the map
 
+#function: to display where traffic concentrates as a heatmap overlay instead of individual points
+#parameters: iataCode - string, layer - string, zooms - list
+#returns: nothing
+def displayDensity(iataCode, layer='all_all', zooms=tile_zooms):
+    for zoom in zooms: #for each zoom
+        if not os.path.exists(tileDir(iataCode, layer, zoom)): #tiles are drawn as the log is collected, only draw them here if they never were
+            updateDensity(iataCode)
+            renderTiles(iataCode, layer, zoom)
+
+    map = folium.Map(location=list(findAirportCoordinatesByIATACode(iataCode)), zoom_start=10) #create the map with the airport at the center
+    folium.TileLayer(
+        tiles=f'../density/tiles/{iataCode}/{layer}/{{z}}/{{x}}/{{y}}.png', #tiles relative to the maps directory
+        attr='Wing Watch',
+        name=f'Traffic density ({layer})',
+        overlay=True,
+        min_zoom=min(zooms),
+        max_native_zoom=max(zooms)
+    ).add_to(map) #add the heatmap on top of the map
+
+    map.save(f'data/flightData/maps/density_map_{iataCode}.html') #save the map
+
 
 if __name__ == "__main__":
     iataCodes = ['BOG', 'GRU', 'LIM']
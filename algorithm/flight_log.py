@@ -0,0 +1,51 @@
+import pandas as pd
+import numpy as np
+import io
+import os
+
+#This file defines how flight logs are read into memory.
+
+flight_log_dtypes = { #in memory schema of a flight log, codes are categories since they repeat, coordinates only need float32 precision (under a meter)
+    'flight_icao': 'category',
+    'airline_icao': 'category',
+    'lat': np.float32,
+    'lng': np.float32,
+    'alt': np.int32,
+    'dep_iata': 'category',
+    'arr_iata': 'category',
+    'status': 'category'
+}
+
+#function: gets the file the flight log of an airport is saved in
+#parameters: iataCode - string
+#returns: file name
+def flightLogFile(iataCode):
+    return f"data/flightData/data/flight_log_{iataCode}.csv"
+
+#function: reads a flight log using the compact flight log schema
+#parameters: iataCode - string
+#returns: Pandas DataFrame
+def readFlightLog(iataCode):
+    return pd.read_csv(flightLogFile(iataCode), dtype=flight_log_dtypes, parse_dates=['timestamp']) #read the log with the schema
+
+#function: reads only the rows of a flight log after a byte offset, so rows that were already read are not parsed again
+#parameters: iataCode - string, start_byte - int, byte offset returned by an earlier read, 0 to read the whole log
+#returns: tuple with a Pandas DataFrame of the new complete rows and the byte offset to start the next read at
+def readFlightLogFrom(iataCode, start_byte=0):
+    with open(flightLogFile(iataCode), 'rb') as log_file: #open the log
+        header = log_file.readline() #the column names are always needed to read rows
+        if not header.strip(): #if the log has no header yet there are no rows to read
+            return (pd.DataFrame(), 0)
+        start_byte = max(start_byte, len(header)) #start after the header
+        log_file.seek(start_byte) #jump to the first row that has not been read
+        new_rows = log_file.read()
+
+    new_rows = new_rows[:new_rows.rfind(b'\n') + 1] #only read complete rows, a row that is still being written is read next time
+    new_flight_data = pd.read_csv(io.BytesIO(header + new_rows), dtype=flight_log_dtypes, parse_dates=['timestamp']) #read the new rows with the schema
+    return (new_flight_data, start_byte + len(new_rows))
+
+#function: gets the size of the flight log of an airport
+#parameters: iataCode - string
+#returns: size in bytes, 0 if there is no log
+def flightLogSize(iataCode):
+    return os.path.getsize(flightLogFile(iataCode)) if os.path.exists(flightLogFile(iataCode)) else 0
@@ -1,3 +1,5 @@
+from density_raster import updateDensity
+from functools import lru_cache
 from datetime import datetime
 import pandas as pd
 import threading
@@ -13,6 +15,7 @@ import os
 #function: to get airport coordinates given the iataCode
 #parameters: iataCode - string
 #returns: tuple with latiutde and longitude
+@lru_cache(maxsize=None) #compiling the airport data is slow, so only do it once per airport
 def findAirportCoordinatesByIATACode(iataCode): 
     with open('data/airport_data.js', 'r') as file: #open file with airport data
         js_code = file.read() #read the file
@@ -28,6 +31,7 @@ def findAirportCoordinatesByIATACode(iataCode):
 #function: to get airport elevation given the iataCode
 #parameters: iataCode - string
 #returns: elevation
+@lru_cache(maxsize=None) #compiling the airport data is slow, so only do it once per airport
 def findAirportElevationByIATACode(iataCode): 
     with open('data/airport_data.js', 'r') as file: #open file with airport data
         js_code = file.read() #read the file
@@ -144,10 +148,16 @@ def trackFlights(iataCode):
     while line_count < max_line_count: #loop until program is terminated
         flight_info = getFlights(iataCode) #get the flights
         new_flight_data_df = pd.DataFrame(flight_info) #add them to a pandas dataframe
-        with open(log_file_name, 'a') as log_file: #open the file
-            new_flight_data_df.to_csv(log_file, header=include_headers, index=False) #add the new dataframe to the file
-            line_count += len(new_flight_data_df) #add new lines to line count
-            include_headers = False
+        if len(new_flight_data_df): #an empty poll has no columns, so writing it would leave the log without a header
+            with open(log_file_name, 'a') as log_file: #open the file
+                new_flight_data_df.to_csv(log_file, header=include_headers, index=False) #add the new dataframe to the file
+                line_count += len(new_flight_data_df) #add new lines to line count
+                include_headers = False
+
+        try:
+            updateDensity(iataCode) #add the new polls to the density grids and redraw the tiles they touch
+        except Exception as e: #the density grids are optional, so a failure must not stop data collection
+            print(f"Error updating the density grids of {iataCode}: {e}")
 
         file_exists = False
         time.sleep(2) #wait 2 seconds then repeat
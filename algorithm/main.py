@@ -1,5 +1,8 @@
 from clusters import getPaths
-from spots import getParks, generatePoints, miles_to_degrees, displayLinePointData
+from spots import searchParks, scorePlaces, displayLinePointData
+from path_model import samplePath
+from path_store import savePathStore
+from spatial_index import updateAirport
 import pandas as pd
 import numpy as np
 import threading
@@ -14,51 +17,48 @@ from scipy.interpolate import interp1d
 
 #function: saves flight path data to a csv
 #parameters: flight_path - dictionary, iataCode - string, line_index - int
-#returns: nothing
+#returns: list of points along the line
 def savePath(line, iataCode, line_index):
     path_csv = f"data/pathData/paths_{iataCode}.csv"  #path to the CSV file
     path_id = iataCode + str(line_index)  #create a unique id for the flight path
 
     file_mode = 'w' if line_index == 0 else 'a'  #determine the file mode based on whether the file is being written for the first time or appended
 
+    points = samplePath(line['model'], 0.3) #generate points 0.3 miles apart along line
+    # displayLinePointData(points) #display points on a map
+
     with open(path_csv, mode=file_mode, newline='') as file:  #open the file in the determined mode
         writer = csv.writer(file)  #create a writer
 
         if line_index == 0:  #if the file is being written for the first time
             writer.writerow(['path_id', 'latitude', 'longitude'])  #write the header row
 
-        points = generatePoints(line['coefficients'], line['min_long'], line['max_long'], miles_to_degrees(0.3, line['min_lat'])) #generate points along line
-        # displayLinePointData(points) #display points on a map
+        writer.writerows([path_id, lat, lon] for lat, lon in points) #write the path_id, latitude, and longitude of every point to the file
 
-        latitudes = [point[0] for point in points]  #extract the latitudes from the points
-        longitudes = [point[1] for point in points] #extract the longitudes from the points
-
-        for lat, lon in zip(latitudes, longitudes): #for each latitude and longitude
-            writer.writerow([path_id, lat, lon]) #write the path_id, latitude, and longitude to the file
+    return points #return the points so they can be added to the path store
 
 #function: takes data from data_path, gets paths from data, finds parks along paths, and saves data to csv
 #parameters: iataCode - string
 #returns: a list of spots in JSON format
 def getSpots(iataCode):
-    spots = set() #create empty set
     flight_path_lines = getPaths(iataCode) #get flight paths
+    places = [] #create empty list of candidate places
+    path_points = [] #create empty list of points for each path
     line_index = 0
     for line in flight_path_lines: #for each flight path
-        line_id = iataCode + str(line_index) #create a unique id for the flight path
-        parks = getParks(line)
-        modified_parks = []
-        for park_str in parks:
-            park = json.loads(park_str) # Parse the JSON string into a dictionary
-            park['path_id'] = str(line_id)
-            modified_parks.append(json.dumps(park)) # Convert the dictionary back into a JSON string if necessary
-        spots.update(modified_parks)
-
-        savePath(line, iataCode, line_index)
+        places += searchParks(line) #collect the parks around the path
+
+        path_points.append(savePath(line, iataCode, line_index)) #save the path to the csv and keep its points
         line_index += 1
 
+    savePathStore(iataCode, path_points) #save all paths in the binary path format
+
+    spots = scorePlaces(places, flight_path_lines, iataCode) #score every unique park against every path at once and assign it its best path
+
     spots = list(spots) #turn spots into a list
 
     if len(spots) == 0: #if there are no spots
+        updateAirport(iataCode) #update the spatial index with the new paths
         return spots #return empty list
 
     spots_data = [json.loads(spot) for spot in spots] #parse the JSON data
@@ -76,6 +76,8 @@ def getSpots(iataCode):
     
     df.to_csv(f'data/spotData/data/spots_{iataCode}.csv', index=False) #save data to .csv file if df is not empty
 
+    updateAirport(iataCode) #rebuild only this airport's entries in the spatial index
+
     return spots
 
 #function: finds spots for all inputted airports simultaneously
@@ -0,0 +1,206 @@
+from scipy.sparse.csgraph import minimum_spanning_tree, shortest_path
+from scipy.interpolate import splprep, splev
+from scipy.spatial.distance import cdist
+import numpy as np
+import math
+
+#This file fits a centerline to the points of a flight path cluster.  Every path model turns the cluster's points into a dense centerline, so sampling along the path and finding the closest point on it work the same way for every model.
+
+earth_radius_miles = 3958.8 #earth's radius in miles
+miles_per_degree = 2 * math.pi * earth_radius_miles / 360 #miles in one degree of latitude
+
+#function: converts coordinates into miles on a flat plane around an origin
+#parameters: lats - array, lngs - array, origin - (latitude, longitude) tuple
+#returns: tuple with x and y arrays in miles
+def toPlane(lats, lngs, origin):
+    x = (np.asarray(lngs, dtype=np.float64) - origin[1]) * math.cos(math.radians(origin[0])) * miles_per_degree #east-west distance from the origin
+    y = (np.asarray(lats, dtype=np.float64) - origin[0]) * miles_per_degree #north-south distance from the origin
+    return (x, y)
+
+#function: converts miles on a flat plane around an origin back into coordinates
+#parameters: x - array, y - array, origin - (latitude, longitude) tuple
+#returns: tuple with latitude and longitude arrays
+def fromPlane(x, y, origin):
+    lats = origin[0] + np.asarray(y) / miles_per_degree #latitude
+    lngs = origin[1] + np.asarray(x) / (math.cos(math.radians(origin[0])) * miles_per_degree) #longitude
+    return (lats, lngs)
+
+#function: finds the distance from many points to a line and how far along the line the closest point is
+#parameters: x - array, y - array, line_x - array, line_y - array, chunk_size - int
+#returns: tuple with the distances and the positions along the line, both in miles
+def projectToLine(x, y, line_x, line_y, chunk_size=256):
+    start = np.stack([line_x[:-1], line_y[:-1]], axis=1)[None, :, :] #start of each segment
+    segment = np.stack([np.diff(line_x), np.diff(line_y)], axis=1)[None, :, :] #direction of each segment
+    segment_length_squared = np.maximum(np.sum(segment**2, axis=2), 1e-18) #squared length of each segment
+    arc_length = np.concatenate([[0.0], np.cumsum(np.hypot(np.diff(line_x), np.diff(line_y)))]) #distance along the line to each of its points
+
+    distances = np.empty(len(x))
+    along = np.empty(len(x))
+    for chunk_start in range(0, len(x), chunk_size): #work through the points in chunks to limit memory
+        chunk = slice(chunk_start, chunk_start + chunk_size)
+        plane_points = np.stack([x[chunk], y[chunk]], axis=1)[:, None, :] #points as a column
+
+        t = np.clip(np.sum((plane_points - start) * segment, axis=2) / segment_length_squared, 0, 1) #position of the closest point along each segment
+        segment_distances = np.sqrt(np.sum((plane_points - (start + t[:, :, None] * segment))**2, axis=2)) #distance to each segment
+
+        nearest = np.argmin(segment_distances, axis=1) #closest segment for each point
+        rows = np.arange(len(nearest))
+        distances[chunk] = segment_distances[rows, nearest] #distance to the closest segment
+        along[chunk] = arc_length[nearest] + t[rows, nearest] * (arc_length[nearest + 1] - arc_length[nearest]) #distance along the line to the closest point
+
+    return (distances, along)
+
+#function: finds the rough route of a cluster by joining the centers of small grid cells with a minimum spanning tree and taking its longest branch, so curved paths are followed instead of folded onto one direction
+#parameters: x - array, y - array, weights - array, cell_miles - float
+#returns: tuple with x and y arrays of the route, in order along the path
+def clusterSkeleton(x, y, weights, cell_miles=0.5):
+    cells = np.stack([np.floor(x / cell_miles), np.floor(y / cell_miles)], axis=1) #grid cell of each point
+    _, cell_index = np.unique(cells, axis=0, return_inverse=True) #number the cells with points
+    cell_index = cell_index.ravel()
+    cell_weights = np.bincount(cell_index, weights=weights) #total weight in each cell
+    centers = np.stack([np.bincount(cell_index, weights=weights * x), np.bincount(cell_index, weights=weights * y)], axis=1) / np.maximum(cell_weights, 1e-12)[:, None] #weighted center of each cell
+    if len(centers) < 2: #if every point is in one cell
+        return (centers[:, 0], centers[:, 1])
+
+    tree = minimum_spanning_tree(cdist(centers, centers) + 1e-9) #join the cells with the shortest total distance, the small offset keeps cells with the same center joined
+    first_end = np.argmax(shortest_path(tree, directed=False, indices=0)) #farthest cell from any cell is one end of the longest branch
+    distances, predecessors = shortest_path(tree, directed=False, indices=first_end, return_predecessors=True)
+    cell = np.argmax(distances) #farthest cell from that end is the other end
+
+    route = [cell]
+    while predecessors[cell] >= 0: #walk back to the first end
+        cell = predecessors[cell]
+        route.append(cell)
+    route_points = centers[route]
+
+    first_direction = route_points[0] - route_points[1] #direction the route leaves from at each end
+    last_direction = route_points[-1] - route_points[-2]
+    first_end = route_points[0] + first_direction / max(np.hypot(*first_direction), 1e-12) * cell_miles #extend the route by a cell at each end so points past the last cell centers are not all put in the end bins
+    last_end = route_points[-1] + last_direction / max(np.hypot(*last_direction), 1e-12) * cell_miles
+    route_points = np.vstack([first_end, route_points, last_end])
+    return (route_points[:, 0], route_points[:, 1])
+
+#function: orders the points of a cluster along its route and averages them in bins, which works for curved paths in any direction
+#parameters: x - array, y - array, weights - array, bin_miles - float, spread_warning_miles - float
+#returns: tuple with the x, y, and total weight of each non-empty bin, in order along the path
+def binAlongPath(x, y, weights, bin_miles=0.25, spread_warning_miles=0.5):
+    skeleton_x, skeleton_y = clusterSkeleton(x, y, weights) #rough route of the cluster
+    if len(skeleton_x) < 2: #if the cluster is too small to have a route
+        return (np.array([np.average(x, weights=weights)]), np.array([np.average(y, weights=weights)]), np.array([np.sum(weights)]))
+    distances, t = projectToLine(x, y, skeleton_x, skeleton_y) #position of each point along the route
+
+    num_bins = int(np.clip(np.ceil((t.max() - t.min()) / bin_miles), 1, 500)) #number of bins along the path
+    bins = np.minimum(((t - t.min()) / max(t.max() - t.min(), 1e-12) * num_bins).astype(int), num_bins - 1) #bin of each point
+
+    bin_weights = np.bincount(bins, weights=weights, minlength=num_bins) #total weight in each bin
+    filled = bin_weights > 0 #bins with points in them
+    bin_x = np.bincount(bins, weights=weights * x, minlength=num_bins)[filled] / bin_weights[filled] #weighted mean x of each bin
+    bin_y = np.bincount(bins, weights=weights * y, minlength=num_bins)[filled] / bin_weights[filled] #weighted mean y of each bin
+
+    spread = np.sqrt(np.bincount(bins, weights=weights * distances**2, minlength=num_bins)[filled] / bin_weights[filled]) #how far the points of each bin are from the route
+    if np.any(spread > spread_warning_miles): #if some points are far from the route, the cluster branches and the centerline only follows its longest branch
+        print(f"Warning: {np.sum(spread > spread_warning_miles)} of {len(spread)} bins spread up to {spread.max():.2f} miles from the path, the cluster may branch")
+    return (bin_x, bin_y, bin_weights[filled])
+
+#function: fits a smoothing spline through the binned points of a cluster
+#parameters: x - array, y - array, weights - array, smoothing_miles - float
+#returns: tuple with x and y arrays of the dense centerline
+def splineCenterline(x, y, weights, smoothing_miles=0.1):
+    bin_x, bin_y, bin_weights = binAlongPath(x, y, weights) #ordered points along the path
+    if len(bin_x) < 2: #if every point is in one bin
+        return (np.repeat(bin_x, 2), np.repeat(bin_y, 2))
+
+    degree = min(3, len(bin_x) - 1) #cubic spline, lower degree when there are only a few bins
+    tck, _ = splprep([bin_x, bin_y], k=degree, s=len(bin_x) * smoothing_miles**2) #smoothing spline, each bin may be about smoothing_miles off the line
+    length = np.sum(np.hypot(np.diff(bin_x), np.diff(bin_y))) #approximate length of the path
+    u = np.linspace(0, 1, int(np.clip(length / 0.02, 200, 5000))) #a point about every 0.02 miles
+    return tuple(splev(u, tck))
+
+#function: joins the binned points of a cluster with straight lines
+#parameters: x - array, y - array, weights - array
+#returns: tuple with x and y arrays of the centerline
+def linearCenterline(x, y, weights):
+    bin_x, bin_y, _ = binAlongPath(x, y, weights) #ordered points along the path
+    if len(bin_x) < 2: #if every point is in one bin
+        return (np.repeat(bin_x, 2), np.repeat(bin_y, 2))
+    return (bin_x, bin_y)
+
+#function: fits the original degree 20 polynomial of latitude in longitude, kept to compare against older results
+#parameters: x - array, y - array, weights - array, degree - int
+#returns: tuple with x and y arrays of the dense centerline
+def polynomialCenterline(x, y, weights, degree=20):
+    coefficients = np.polyfit(x, y, degree, w=weights) #latitude as a polynomial of longitude, both in miles so the fit is better conditioned
+    curve_x = np.linspace(np.min(x), np.max(x), 2000) #sample the polynomial densely
+    return (curve_x, np.polyval(coefficients, curve_x))
+
+path_models = { #available path models, each takes x, y, and weights in miles and returns a centerline
+    'spline': splineCenterline,
+    'linear': linearCenterline,
+    'polynomial': polynomialCenterline
+}
+
+#function: builds a path model from the points of its centerline
+#parameters: lats - array, lngs - array, model - string
+#returns: dictionary with the model name, centerline coordinates, cumulative arc length in miles, and plane origin
+def buildPathModel(lats, lngs, model):
+    centerline = np.stack([lats, lngs], axis=1) #(latitude, longitude) rows
+    origin = (float(np.mean(lats)), float(np.mean(lngs))) #center of the path
+    x, y = toPlane(lats, lngs, origin) #centerline in miles
+    arc_length = np.concatenate([[0.0], np.cumsum(np.hypot(np.diff(x), np.diff(y)))]) #distance along the path to each centerline point
+    return {
+        'model': model,
+        'centerline': centerline,
+        'arc_length': arc_length,
+        'origin': origin
+    }
+
+#function: fits a path model to the points of a cluster
+#parameters: lats - array, lngs - array, weights - array or None, model - string
+#returns: path model dictionary
+def fitPathModel(lats, lngs, weights=None, model='spline'):
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    weights = np.ones(len(lats)) if weights is None else np.asarray(weights, dtype=np.float64) #every point counts the same if there are no weights
+
+    origin = (float(np.mean(lats)), float(np.mean(lngs))) #center of the cluster
+    x, y = toPlane(lats, lngs, origin) #fit in miles so both directions are on the same scale
+    curve_x, curve_y = path_models[model](x, y, weights) #get the centerline
+    curve_lats, curve_lngs = fromPlane(curve_x, curve_y, origin) #convert it back to coordinates
+    return buildPathModel(curve_lats, curve_lngs, model)
+
+#function: gets the total length of a path
+#parameters: path_model - dictionary
+#returns: length in miles
+def pathLength(path_model):
+    return float(path_model['arc_length'][-1])
+
+#function: gets the points at the given distances along a path
+#parameters: path_model - dictionary, distances - array of miles from the start of the path
+#returns: array of (latitude, longitude) rows
+def pointsAtDistances(path_model, distances):
+    arc_length = path_model['arc_length']
+    centerline = path_model['centerline']
+    lats = np.interp(distances, arc_length, centerline[:, 0]) #interpolate latitude by arc length
+    lngs = np.interp(distances, arc_length, centerline[:, 1]) #interpolate longitude by arc length
+    return np.stack([lats, lngs], axis=1)
+
+#function: generates points interval_miles apart along a path
+#parameters: path_model - dictionary, interval_miles - float
+#returns: list of (latitude, longitude) points
+def samplePath(path_model, interval_miles):
+    distances = np.arange(0, pathLength(path_model), interval_miles) #distances along the path to sample at
+    if len(distances) == 0: #a path whose points all fell in one spot has no length, but still gets its start point
+        distances = np.array([0.0])
+    return [(float(lat), float(lng)) for lat, lng in pointsAtDistances(path_model, distances)]
+
+#function: finds the closest point on a path to each of many points
+#parameters: path_model - dictionary, points - array of (latitude, longitude) rows, chunk_size - int
+#returns: tuple with the distances in miles, the closest points as (latitude, longitude) rows, and their distance along the path in miles
+def nearestPoints(path_model, points, chunk_size=256):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2) #make sure points are an array of rows
+    origin = path_model['origin']
+    line_x, line_y = toPlane(path_model['centerline'][:, 0], path_model['centerline'][:, 1], origin) #centerline in miles
+    point_x, point_y = toPlane(points[:, 0], points[:, 1], origin) #points in miles
+    distances, along = projectToLine(point_x, point_y, line_x, line_y, chunk_size) #distance to the centerline and position along it
+
+    return (distances, pointsAtDistances(path_model, along), along)
@@ -0,0 +1,124 @@
+import pandas as pd
+import numpy as np
+import json
+import glob
+import os
+
+#This file stores flight paths in a compact binary format.  Every path of an airport is packed into one float32 coordinate array with an offset index, so paths can be memory mapped instead of parsed from a csv.
+
+path_store_dir = "data/pathData/store" #directory the binary path files are saved in
+
+#function: gets the file names used to store the paths of an airport
+#parameters: iataCode - string
+#returns: tuple with the coordinates, offsets, and polylines file names
+def pathStoreFiles(iataCode):
+    coords_file = f"{path_store_dir}/paths_{iataCode}_coords.npy" #float32 array of (latitude, longitude) rows
+    offsets_file = f"{path_store_dir}/paths_{iataCode}_offsets.npy" #int64 array where path i is rows offsets[i] to offsets[i+1]
+    polylines_file = f"{path_store_dir}/paths_{iataCode}_polylines.json" #encoded polylines keyed by path_id
+    return (coords_file, offsets_file, polylines_file)
+
+#function: encodes a list of coordinates using the encoded polyline algorithm used by google maps
+#parameters: coordinates - array of (latitude, longitude) rows, precision - int
+#returns: encoded polyline string
+def encodePolyline(coordinates, precision=5):
+    coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2) #make sure coordinates are an array of rows
+    if len(coordinates) == 0: #if there are no coordinates
+        return "" #return empty polyline
+
+    scaled = np.round(coordinates * (10 ** precision)).astype(np.int64) #scale coordinates to integers
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel() #each point is stored as the difference from the previous point
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1) #zigzag encode so the sign ends up in the lowest bit
+
+    chars = []
+    for value in values.tolist(): #for each value
+        while value >= 0x20: #while more than 5 bits are left
+            chars.append(chr((0x20 | (value & 0x1f)) + 63)) #add 5 bits with the continuation bit set
+            value >>= 5 #move to the next 5 bits
+        chars.append(chr(value + 63)) #add the final 5 bits
+    return "".join(chars) #return the encoded polyline
+
+#function: decodes an encoded polyline string back into coordinates
+#parameters: polyline - string, precision - int
+#returns: float64 array of (latitude, longitude) rows
+def decodePolyline(polyline, precision=5):
+    values = []
+    value = 0
+    shift = 0
+    for char in polyline: #for each character
+        chunk = ord(char) - 63 #get the 5 bit chunk with the continuation bit
+        value |= (chunk & 0x1f) << shift #add the chunk to the current value
+        shift += 5
+        if chunk < 0x20: #if this was the last chunk of the value
+            values.append(~(value >> 1) if value & 1 else value >> 1) #undo the zigzag encoding
+            value = 0
+            shift = 0
+
+    deltas = np.array(values, dtype=np.int64).reshape(-1, 2) #group values back into coordinate pairs
+    return np.cumsum(deltas, axis=0) / (10 ** precision) #add up the differences and scale back to degrees
+
+#function: saves all flight paths of an airport in the binary path format
+#parameters: iataCode - string, paths - list of lists of (latitude, longitude) points
+#returns: nothing
+def savePathStore(iataCode, paths):
+    coords_file, offsets_file, polylines_file = pathStoreFiles(iataCode) #get file names
+    os.makedirs(path_store_dir, exist_ok=True) #make sure the directory exists
+
+    path_arrays = [np.asarray(points, dtype=np.float32).reshape(-1, 2) for points in paths] #convert each path to a float32 array
+    offsets = np.zeros(len(path_arrays) + 1, dtype=np.int64) #path i is rows offsets[i] to offsets[i+1]
+    offsets[1:] = np.cumsum([len(points) for points in path_arrays]) #cumulative number of points
+    coords = np.concatenate(path_arrays) if path_arrays else np.zeros((0, 2), dtype=np.float32) #pack every path into one array
+
+    np.save(coords_file, coords) #save coordinates
+    np.save(offsets_file, offsets) #save offsets
+
+    polylines = {iataCode + str(line_index): encodePolyline(points) for line_index, points in enumerate(paths)} #encode every path for the frontend from the original coordinates, float32 rounding is larger than the polyline precision near 180 degrees longitude
+    with open(polylines_file, 'w') as file: #open the polylines file
+        json.dump(polylines, file) #save polylines
+
+#function: loads the flight paths of an airport without copying them into memory
+#parameters: iataCode - string
+#returns: tuple with list of path_ids, memory mapped coordinates, and offsets
+def loadPathStore(iataCode):
+    coords_file, offsets_file, _ = pathStoreFiles(iataCode) #get file names
+    coords = np.load(coords_file, mmap_mode='r') #memory map the coordinates
+    offsets = np.load(offsets_file) #offsets are small so load them
+    path_ids = [iataCode + str(line_index) for line_index in range(len(offsets) - 1)] #rebuild the path ids
+    return (path_ids, coords, offsets)
+
+#function: gets the points of a single path from loaded path data
+#parameters: coords - array, offsets - array, line_index - int
+#returns: view of the (latitude, longitude) rows of the path
+def getStoredPath(coords, offsets, line_index):
+    return coords[offsets[line_index]:offsets[line_index + 1]] #slicing a memory map does not copy
+
+#function: loads the flight paths of every airport in the path store
+#parameters: none
+#returns: dictionary of iataCode to tuple with list of path_ids, memory mapped coordinates, and offsets
+def loadAllPathStores():
+    stores = {}
+    for offsets_file in sorted(glob.glob(f"{path_store_dir}/paths_*_offsets.npy")): #for each stored airport
+        iataCode = os.path.basename(offsets_file)[len("paths_"):-len("_offsets.npy")] #get the iataCode from the file name
+        stores[iataCode] = loadPathStore(iataCode) #load the airport's paths
+    return stores
+
+#function: loads the encoded polylines of an airport
+#parameters: iataCode - string
+#returns: dictionary of path_id to encoded polyline
+def loadPolylines(iataCode):
+    _, _, polylines_file = pathStoreFiles(iataCode) #get file names
+    with open(polylines_file, 'r') as file: #open the polylines file
+        return json.load(file) #return polylines
+
+#function: converts an existing paths csv into the binary path format
+#parameters: iataCode - string
+#returns: nothing
+def convertPathCSV(iataCode):
+    path_data = pd.read_csv(f"data/pathData/paths_{iataCode}.csv") #read the csv
+    line_indices = path_data['path_id'].str[len(iataCode):].astype(int) #get the line index of each row
+    paths = [group[['latitude', 'longitude']].to_numpy() for _, group in path_data.groupby(line_indices, sort=True)] #group rows by path
+    savePathStore(iataCode, paths) #save them in the binary format
+
+
+if __name__ == "__main__":
+    for path_csv in sorted(glob.glob("data/pathData/paths_*.csv")): #for each existing paths csv
+        convertPathCSV(os.path.basename(path_csv)[len("paths_"):-len(".csv")]) #convert it
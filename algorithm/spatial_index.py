@@ -0,0 +1,264 @@
+from path_store import loadPathStore, pathStoreFiles
+from sklearn.neighbors import BallTree
+import pandas as pd
+import numpy as np
+import pickle
+import json
+import glob
+import sys
+import os
+
+#This file builds a spatial index over the spots and flight paths of every airport so that nearby spots and paths can be found without scanning every file.
+
+earth_radius_miles = 3958.8 #earth's radius in miles
+index_dir = "data/spatialIndex" #directory the index entries of every airport are saved in
+
+#function: builds the index entry for a set of coordinates
+#parameters: coordinates - array of (latitude, longitude) rows, records - list of dictionaries
+#returns: dictionary with the ball tree, coordinates, records, and bounding circle of the coordinates
+def buildEntry(coordinates, records):
+    coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2) #make sure coordinates are an array of rows
+    radians = np.radians(coordinates) #ball tree haversine metric works in radians
+    center = np.radians(coordinates.mean(axis=0)) if len(coordinates) else np.zeros(2) #center of the points
+    radius = np.max(haversineMiles(center, radians)) if len(coordinates) else 0.0 #distance from the center to the furthest point
+
+    return {
+        'tree': BallTree(radians, metric='haversine'),
+        'coordinates': coordinates,
+        'records': records,
+        'center': center,
+        'radius': radius
+    }
+
+#function: gets the haversine distance between one point and many points
+#parameters: point - (latitude, longitude) in radians, points - array of (latitude, longitude) rows in radians
+#returns: array of distances in miles
+def haversineMiles(point, points):
+    points = np.atleast_2d(points) #make sure points are an array of rows
+    dlat = points[:, 0] - point[0] #difference in latitude
+    dlong = points[:, 1] - point[1] #difference in longitude
+    a = np.sin(dlat / 2)**2 + np.cos(point[0]) * np.cos(points[:, 0]) * np.sin(dlong / 2)**2 #square of half the chord length
+    return 2 * earth_radius_miles * np.arcsin(np.sqrt(np.clip(a, 0, 1))) #multiply the central angle by the earth radius
+
+#function: loads the spots of an airport into an index entry
+#parameters: iataCode - string
+#returns: index entry, or None if the airport has no spots
+def loadSpotEntry(iataCode):
+    spot_csv = f"data/spotData/data/spots_{iataCode}.csv" #path to the spots csv
+    if not os.path.exists(spot_csv): #if the airport has no spots
+        return None
+
+    spot_data = pd.read_csv(spot_csv) #read spots
+    if len(spot_data) == 0: #if the file is empty
+        return None
+
+    spot_data = spot_data.astype(object).where(spot_data.notna(), None) #replace missing values with None so records can be sent as JSON
+    return buildEntry(spot_data[['latitude', 'longitude']].to_numpy(dtype=np.float64), spot_data.to_dict('records'))
+
+#function: loads the flight paths of an airport into an index entry
+#parameters: iataCode - string
+#returns: index entry, or None if the airport has no paths
+def loadPathEntry(iataCode):
+    if not os.path.exists(pathStoreFiles(iataCode)[1]): #if the airport has no stored paths
+        return None
+
+    path_ids, coords, offsets = loadPathStore(iataCode) #load the stored paths
+    if len(coords) == 0: #if there are no points
+        return None
+
+    point_path_ids = np.repeat(path_ids, np.diff(offsets)) #path_id of every point
+    records = [{'path_id': path_id} for path_id in point_path_ids] #one record per point
+    return buildEntry(coords, records)
+
+#function: gets the file the index entries of an airport are saved in
+#parameters: iataCode - string
+#returns: file name
+def indexFile(iataCode):
+    return f"{index_dir}/index_{iataCode}.pkl"
+
+#function: builds, saves, and loads the index entries of a single airport, used when one airport is re-run
+#parameters: iataCode - string, index - dictionary or None
+#returns: the updated index, or None if no index was given
+def updateAirport(iataCode, index=None):
+    entries = {'spots': loadSpotEntry(iataCode), 'paths': loadPathEntry(iataCode)} #build the airport's entries, None where there is no data
+    os.makedirs(index_dir, exist_ok=True) #make sure the directory exists
+    with open(indexFile(iataCode) + '.tmp', 'wb') as file: #write to a temporary file so a running process never loads half saved entries
+        pickle.dump(entries, file) #save the entries so other processes can load them without rebuilding
+    os.replace(indexFile(iataCode) + '.tmp', indexFile(iataCode))
+
+    if index is not None: #if an index in memory should be updated too
+        loadAirport(index, iataCode)
+    return index
+
+#function: loads the saved index entries of a single airport into an index
+#parameters: index - dictionary, iataCode - string
+#returns: the updated index
+def loadAirport(index, iataCode):
+    with open(indexFile(iataCode), 'rb') as file: #open the saved entries
+        entries = pickle.load(file)
+    index['modified'][iataCode] = os.path.getmtime(indexFile(iataCode)) #remember which version was loaded
+
+    for kind, entry in entries.items(): #for spots and paths
+        if entry is None: #if there is no data
+            index[kind].pop(iataCode, None) #remove any old entry
+        else:
+            index[kind][iataCode] = entry #replace the old entry
+    return index
+
+#function: builds and saves the index entries of every airport
+#parameters: none
+#returns: dictionary with spot and path entries keyed by iataCode
+def buildSpatialIndex():
+    index = {'spots': {}, 'paths': {}, 'modified': {}} #create empty index
+    spot_codes = {os.path.basename(f)[len("spots_"):-len(".csv")] for f in glob.glob("data/spotData/data/spots_*.csv")} #airports with spots
+    path_codes = {os.path.basename(f)[len("paths_"):-len(".csv")] for f in glob.glob("data/pathData/paths_*.csv")} #airports with paths
+    for iataCode in sorted(spot_codes | path_codes): #for each airport
+        updateAirport(iataCode, index) #build, save, and add its entries
+    return index
+
+#function: loads the saved index entries of every airport, building them first if none have been saved
+#parameters: none
+#returns: dictionary with spot and path entries keyed by iataCode
+def loadSpatialIndex():
+    index_files = glob.glob(f"{index_dir}/index_*.pkl") #saved airports
+    if not index_files: #if the index has never been built
+        return buildSpatialIndex()
+
+    index = {'spots': {}, 'paths': {}, 'modified': {}} #create empty index
+    for index_file in sorted(index_files): #for each saved airport
+        loadAirport(index, os.path.basename(index_file)[len("index_"):-len(".pkl")])
+    return index
+
+#function: reloads the airports whose saved entries changed since they were loaded, so a long running process sees airports that were re-run
+#parameters: index - dictionary
+#returns: the updated index
+def refreshSpatialIndex(index):
+    for index_file in glob.glob(f"{index_dir}/index_*.pkl"): #for each saved airport
+        iataCode = os.path.basename(index_file)[len("index_"):-len(".pkl")]
+        try:
+            if index['modified'].get(iataCode) != os.path.getmtime(index_file): #if it was saved again or is new
+                loadAirport(index, iataCode)
+        except (OSError, EOFError, pickle.UnpicklingError) as error: #if the file is being replaced or is damaged, keep the entries already loaded
+            print(f"Could not reload the spatial index of {iataCode}: {error}", file=sys.stderr)
+    return index
+
+#function: formats the matches of a query as a list of records with distances
+#parameters: entry - dictionary, indices - array, distances - array or None
+#returns: list of dictionaries
+def formatMatches(entry, indices, distances=None):
+    matches = []
+    for n, i in enumerate(indices): #for each match
+        match = dict(entry['records'][i]) #copy the record
+        match['latitude'], match['longitude'] = (float(value) for value in entry['coordinates'][i]) #add coordinates
+        if distances is not None: #if distances were calculated
+            match['distance'] = float(distances[n]) #add distance in miles
+        matches.append(match)
+    return matches
+
+#function: keeps only the first match of each path, which is the closest point when the matches are sorted by distance
+#parameters: matches - list of dictionaries
+#returns: list of dictionaries
+def firstPerPath(matches):
+    seen = set()
+    first = []
+    for match in matches: #for each match, in order
+        if match['path_id'] not in seen: #if this is the first point of the path
+            seen.add(match['path_id'])
+            first.append(match)
+    return first
+
+#function: finds all spots or paths within radius_miles of a point
+#parameters: index - dictionary, lat - float, lng - float, radius_miles - float, kind - 'spots' or 'paths'
+#returns: list of matches sorted by distance
+def queryRadius(index, lat, lng, radius_miles, kind='spots'):
+    point = np.radians([lat, lng]) #query point in radians
+    matches = []
+    for entry in index[kind].values(): #for each airport
+        if haversineMiles(point, entry['center'])[0] - entry['radius'] > radius_miles: #if every point of the airport is too far away
+            continue
+        indices, distances = entry['tree'].query_radius([point], r=radius_miles / earth_radius_miles, return_distance=True) #find points in radius
+        matches += formatMatches(entry, indices[0], distances[0] * earth_radius_miles)
+
+    matches.sort(key=lambda match: match['distance']) #sort by distance
+    return firstPerPath(matches) if kind == 'paths' else matches #matches are sorted, so this keeps the closest point of each path
+
+#function: finds the k nearest spots or paths to a point
+#parameters: index - dictionary, lat - float, lng - float, k - int, kind - 'spots' or 'paths'
+#returns: list of matches sorted by distance
+def queryNearest(index, lat, lng, k=5, kind='spots'):
+    point = np.radians([lat, lng]) #query point in radians
+    entries = list(index[kind].values())
+    if not entries or k <= 0: #if the index is empty or no matches were asked for
+        return []
+
+    lower_bounds = haversineMiles(point, np.array([entry['center'] for entry in entries])) - np.array([entry['radius'] for entry in entries]) #closest any point of each airport could be
+    matches = []
+    for i in np.argsort(lower_bounds): #for each airport, closest first
+        if len(matches) >= k and lower_bounds[i] > matches[k - 1]['distance']: #if this airport can not beat the current k nearest
+            break
+        entry = entries[i]
+        count = len(entry['coordinates']) if kind == 'paths' else min(k, len(entry['coordinates'])) #every point may belong to the same path, so query them all for paths
+        distances, indices = entry['tree'].query([point], k=count) #find nearest points
+        new_matches = formatMatches(entry, indices[0], distances[0] * earth_radius_miles)
+        matches = sorted(matches + new_matches, key=lambda match: match['distance']) #merge with matches from other airports
+        if kind == 'paths':
+            matches = firstPerPath(matches) #keep the closest match of each path
+        matches = matches[:k] #keep the k nearest
+
+    return matches
+
+#function: finds all spots or paths inside a bounding box
+#parameters: index - dictionary, north - float, east - float, south - float, west - float, kind - 'spots' or 'paths'
+#returns: list of matches, for paths one point of each path inside the box (the first one stored, not the closest to anything)
+def queryBoundingBox(index, north, east, south, west, kind='spots'):
+    matches = []
+    for entry in index[kind].values(): #for each airport
+        coordinates = entry['coordinates']
+        inside = (coordinates[:, 0] <= north) & (coordinates[:, 0] >= south) & (coordinates[:, 1] <= east) & (coordinates[:, 1] >= west) #points inside the box
+        matches += formatMatches(entry, np.nonzero(inside)[0])
+
+    if kind == 'paths': #one match per path
+        return firstPerPath(matches)
+    return matches
+
+
+#function: runs one query given as a list of command line style arguments
+#parameters: index - dictionary, arguments - list of strings
+#returns: list of matches
+def runQuery(index, arguments):
+    query, args, kind = arguments[0], [float(arg) for arg in arguments[1:-1]], arguments[-1] #read the query
+    if kind not in ('spots', 'paths'): #only spots and paths are indexed
+        raise ValueError(f"Unknown kind: {kind}")
+
+    if query == 'radius':
+        return queryRadius(index, args[0], args[1], args[2], kind)
+    elif query == 'nearest':
+        return queryNearest(index, args[0], args[1], int(args[2]), kind)
+    elif query == 'bbox':
+        return queryBoundingBox(index, args[0], args[1], args[2], args[3], kind)
+    raise ValueError(f"Unknown query: {query}")
+
+
+#usage: python spatial_index.py radius <lat> <lng> <radius_miles> <spots|paths>
+#       python spatial_index.py nearest <lat> <lng> <k> <spots|paths>
+#       python spatial_index.py bbox <north> <east> <south> <west> <spots|paths>
+#       python spatial_index.py serve
+#prints the matches as JSON so they can be read by the web app's router
+#serve keeps the index loaded and answers one query per line of stdin with one line of JSON, so each query takes milliseconds instead of starting python
+#       python spatial_index.py build
+#rebuilds and saves the entries of every airport
+if __name__ == "__main__":
+    if sys.argv[1] == 'build':
+        buildSpatialIndex() #rebuild every airport
+    elif sys.argv[1] == 'serve':
+        index = loadSpatialIndex() #load the saved index once
+        for line in sys.stdin: #for each query
+            if not line.strip(): #skip empty lines
+                continue
+            try:
+                result = runQuery(refreshSpatialIndex(index), line.split()) #pick up airports that were re-run, then answer the query
+            except (ValueError, IndexError) as error: #if the query could not be read
+                result = {'error': str(error)}
+            print(json.dumps(result), flush=True)
+    else:
+        print(json.dumps(runQuery(loadSpatialIndex(), sys.argv[1:]))) #load the saved index and answer one query
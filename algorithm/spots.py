@@ -1,9 +1,6 @@
 from flight_paths import findAirportCoordinatesByIATACode
-from scipy.spatial.distance import euclidean
-from scipy.interpolate import interp1d
-from scipy.optimize import minimize
+from path_model import samplePath, nearestPoints, buildPathModel
 import cartopy.feature as cfeature
-from scipy.integrate import quad
 import matplotlib.pyplot as plt
 import cartopy.crs as ccrs
 import pandas as pd
@@ -14,24 +11,6 @@ import json
 
 #This file is used to get the spots around the flight path.
 
-#function: converts distance_degrees into miles based on the position given
-#parameters: lat - float, long - float, distance_degrees - float
-#returns: distance in miles
-def degrees_to_miles(lat, long, distance_degrees):
-    lat1 = math.radians(lat) #convert lat to radians
-    long1 = math.radians(long) #convert long to radians
-    lat2 = math.radians(lat) #convert lat to radians
-    long2 = math.radians(long + distance_degrees) #convert long + distance_degrees to radians
-
-    earth_radius_miles = 3958.8 #set the earths radius
-
-    dlong = long2 - long1 #find the difference between the longitudes
-    dlat = lat2 - lat1 #find the difference between the latitudes
-    a = math.sin(dlat / 2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlong / 2)**2 #intermediate value representing the square of half the angular separation
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a)) #intermediate value representing the central angle
-    distance_miles = earth_radius_miles * c #get the distance in miles
-    return distance_miles
-
 #function: converts distance_miles into degrees based on the latitude given
 #parameters: distance_miles - float, latitude - float
 #returns: distance in degrees
@@ -41,122 +20,6 @@ def miles_to_degrees(distance_miles, latitude):
     distance_degrees = (distance_miles / circumference_at_latitude) * 360.0 #calculate degrees
     return distance_degrees #return degrees
 
-#function: gets distance between point and point on polynomial line at x
-#parameters: x - float, point - tuple, coefficients - list
-#returns: distance in degrees
-def point_to_polynomial_distance(x, point, coefficients):
-    x_val = x[0] if np.ndim(x) > 0 else x #if x is in a list then get it at index 0
-    poly_lat = np.polyval(coefficients, x_val) #get the equivalent latitude for x along line
-    distance = euclidean((poly_lat, x_val), (point[0], point[1])) #calculate euclidean distance
-    return distance #return distance
-
-#function: finds the shortest distance between a point and a polynomial line
-#parameters: point - tuple, line - dict
-#returns: minimum distance in miles
-def pointLineDistance(point, line):
-    coefficients = line['coefficients'] #get coefficients
-    min_long = line['min_long'] #get minimum longitude
-    max_long = line['max_long'] #get maximum longitude
-    bounds = [(min_long, max_long)] #define bounds
-    x0 = [np.mean([min_long, max_long])] #get intial x-value at midpoint
-
-    result = minimize( #use minimize function to find smallest distance
-    point_to_polynomial_distance, #call point_to_polynomial_distance
-    x0, #set initial x
-    args=(point, coefficients), #set point and coefficients as arguments
-    bounds=bounds, #set bounds
-    method='trust-constr',  #set method
-)
-    if result.success: #if minimize function was successful
-        closest_lon = result.x[0] #get the closest longitude
-        closest_lat = np.polyval(coefficients, closest_lon) #use line to calculate equivalent latitude
-        closest_point_on_curve = (closest_lat, closest_lon) #set tuple with coordinate pair
-        min_distance = euclidean(closest_point_on_curve, point) #calculate the euclidean distance between point and closest point
-        min_distance_miles = degrees_to_miles(closest_lat, closest_lon, min_distance) #convert distance to miles
-        return min_distance_miles #return distance
-    else: #if minimize function was not successful
-        # Print out debugging information
-        print("Optimization failed:")
-        print("Message:", result.message)
-        print("Status Code:", result.status)
-        print("Number of Iterations:", result.nit)
-        print("Number of Function Evaluations:", result.nfev)
-        print("Last Function Evaluation Value:", result.fun)
-        print("Last x Value:", result.x)
-        raise ValueError("Optimization failed. Please check the input data and try again.") #call error
-
-#function: gets the haversine distance between two points
-#parameters: lat1 - float, long1 - float, lat2 - float, long2 - float
-#returns: distance between points in miles
-def haversine(lat1, long1, lat2, long2):
-    earth_radius_miles = 3958.8 #set earth radius
-
-    lat1, long1, lat2, long2 = map(math.radians, [lat1, long1, lat2, long2]) #convert latitude and longitude from degrees to radians
-
-    # Haversine formula
-    dlat = lat2 - lat1 #difference in latitude
-    dlong = long2 - long1 #distance in longitude
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlong/2)**2 #intermediate value representing the square of half the angular separation
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a)) #intermediate value representing the central angle
-    distance = earth_radius_miles * c #multiply by earth radius in miles
-
-    return distance
-
-#function: gets the average altitude of planes in radius from point
-#parameters: point - tuple, cluster_df - DataFrame, radius_miles - float
-#returns: average altitude
-def getAverageAltitude(point, cluster_df, radius_miles):
-    lat, long = point #set lat and long
-    average_altitude = float("nan")
-    while np.isnan(average_altitude):
-        filtered_cluster_df = cluster_df[cluster_df.apply(lambda row: haversine(lat, long, row['lat'], row['lng']) <= radius_miles, axis=1)] #filter out all datapoints outside radius
-        filtered_cluster_df['alt'] = pd.to_numeric(filtered_cluster_df['alt'], errors='coerce')
-        average_altitude = filtered_cluster_df['alt'].mean() #calculate average altitude
-        radius_miles+=0.1
-    return average_altitude #return average altitude
-
-def getDistanceFromAirport(spot_coords, iataCode):
-    airport_coords = findAirportCoordinatesByIATACode(iataCode)
-    distance = haversine(spot_coords[0], spot_coords[1], airport_coords[0], airport_coords[1])
-    return distance
-
-#function: calculates the derivative of a polynomial and gets the value at x
-#parameters: x - float, coefficients - list
-#returns: value of derivative polynomial at x
-def derivative(x, coefficients):
-    p = np.poly1d(coefficients) #assert that coefficients are in 1d
-    return np.polyder(p)(x) #return value of derivative polynomial at x
-
-#function: calculates infinitesmial element of arc length for polynomial line at point x
-#parameters: x - float, coefficients - list
-#returns: value of arc length differential
-def arcLengthElement(x, coefficients):
-    return np.sqrt(1 + derivative(x, coefficients)**2) #return arc length differential
-
-#function: generates points interval distance apart along polynomial line
-#parameters: coefficients - list, start_x - float, end_x - float, interval - float
-#returns: list of points
-def generatePoints(coefficients, start_x, end_x, interval):
-    x_range = np.linspace(start_x, end_x, 1000) #calculate the arc lengths for a range of x-values
-    arc_lengths = [quad(arcLengthElement, start_x, x, args=(coefficients))[0] for x in x_range] #generate list of arc lengths
-    
-    arc_length_to_x = interp1d(arc_lengths, x_range) #create an interpolation function based on the calculated arc lengths
-    
-    x_values = [start_x] #initialize x-values list
-    current_arc_length = 0 #set initial arc length to 0
-    
-    #find each x-value at the specified interval along the curve
-    while current_arc_length < arc_lengths[-1]: #while current arc length is less than the total arc length
-        current_arc_length += interval #increase current arc length by the interval
-        if current_arc_length >= arc_lengths[-1]: #if current arc length is greater than the total arc length
-            break #break out of while loop
-        next_x = arc_length_to_x(current_arc_length) #calculate next value of x
-        x_values.append(next_x) #append x-value to x-values list
-        
-    points = [(float(np.polyval(coefficients, x)), float(x)) for x in x_values] #evaluate polynomial line at each x-value for corresponding y-values
-
-    return points #return points
-
 #function: display the points along the line on a map
 #parameters: points - list
 #returns: nothing
@@ -186,16 +49,15 @@ def displayLinePointData(points):
     plt.show() #show plot
 
 
-#function: takes a line and gets all the parks around it
-#parameters: line - dictionary
-#returns: a list of parks
-def getParks(line):
-    search_distance_miles = 0.3 #distance from the line we will search for parks in miles
+#function: takes a line and searches for all the parks around it
+#parameters: line - dictionary, search_distance_miles - float
+#returns: a list of places
+def searchParks(line, search_distance_miles=0.3):
     search_distance_meters = search_distance_miles * 1609.34 #convert it to meters
-    points = generatePoints(line['coefficients'], line['min_long'], line['max_long'], miles_to_degrees(search_distance_miles, line['min_lat'])) #generate points along line
+    points = samplePath(line['model'], search_distance_miles) #generate points along line
     # displayLinePointData(points) #display point data
 
-    unique_spots = set() #create empty set of spots
+    places = [] #create empty list of places
 
     headers = { #set headers
         'Content-Type': 'application/json', #content type JSON
@@ -225,51 +87,111 @@ def getParks(line):
         if response.status_code == 200: #if api call was successfull
             data = json.loads(response.text) #get the data
             if 'places' in data: #if data was returned
-                places = data['places'] #get the places
-                for place in places: #for each place
-                    point = (place['location']['latitude'], place['location']['longitude']) #get coordinates
-                    distance_from_line = pointLineDistance(point, line)
-                    if distance_from_line <= search_distance_miles: #if point is less than search_distance_miles distance away
-                        place['airport'] = str(line['cluster']['airport'].iloc[0])
-                        place['distanceFromFlightpath'] = distance_from_line #add the distance_from_line to the object
-                        place['averageAltitude'] = getAverageAltitude(point, line['cluster'], search_distance_miles) 
-                        place_coords = (place['location']['latitude'], place['location']['longitude'])
-                        place['distanceFromAirport'] = getDistanceFromAirport(place_coords, place['airport'])
-                        unique_spots.add(json.dumps(place)) #add spot to unique spots
+                places += data['places'] #add the places
         else: #if api call was not successfull
             print("Error: API call failed")
             print(response.text)
-    spots = list(unique_spots) #turn unique spots into list
-    # print(spots)
-    return spots #return spots
+    return places #return places
+
+#function: gets a key that identifies a place across searches
+#parameters: place - dictionary
+#returns: string
+def placeKey(place):
+    return place.get('googleMapsUri') or json.dumps(place['location'], sort_keys=True) #use the maps link, or the location if there is no link
+
+#function: gets the haversine distance between every pair of points in two arrays
+#parameters: lats1 - array, longs1 - array, lats2 - array, longs2 - array
+#returns: matrix of distances in miles with a row for each point in the first array
+def haversineMatrix(lats1, longs1, lats2, longs2):
+    earth_radius_miles = 3958.8 #set earth radius
+
+    lats1, longs1 = np.radians(lats1)[:, None], np.radians(longs1)[:, None] #first points as a column
+    lats2, longs2 = np.radians(lats2)[None, :], np.radians(longs2)[None, :] #second points as a row
+
+    a = np.sin((lats2 - lats1) / 2)**2 + np.cos(lats1) * np.cos(lats2) * np.sin((longs2 - longs1) / 2)**2 #square of half the angular separation
+    return 2 * earth_radius_miles * np.arctan2(np.sqrt(a), np.sqrt(1 - a)) #central angle times earth radius
+
+#function: gets the average altitude of planes around many points at once, widening the radius for points with no planes nearby
+#parameters: place_coords - array of (latitude, longitude) rows, cluster_df - DataFrame, radius_miles - float
+#returns: array of average altitudes, NaN if no plane in the cluster has an altitude
+def getAverageAltitudes(place_coords, cluster_df, radius_miles):
+    altitudes = pd.to_numeric(cluster_df['alt'], errors='coerce').to_numpy(dtype=np.float64) #altitudes of the planes
+    has_altitude = ~np.isnan(altitudes) #only planes with an altitude count
+    if not has_altitude.any(): #if no plane has an altitude
+        return np.full(len(place_coords), np.nan)
+    altitudes = altitudes[has_altitude]
+    distances = haversineMatrix(place_coords[:, 0], place_coords[:, 1], cluster_df['lat'].to_numpy()[has_altitude], cluster_df['lng'].to_numpy()[has_altitude]) #distance from each place to each plane
+
+    nearest = distances.min(axis=1) #distance to the closest plane
+    steps = np.maximum(np.ceil((nearest - radius_miles) / 0.1 - 1e-9), 0) #number of 0.1 mile steps needed to reach a plane
+    radii = radius_miles + steps * 0.1 #radius used for each place
+
+    within = distances <= radii[:, None] #planes inside each place's radius
+    return (within * altitudes).sum(axis=1) / within.sum(axis=1) #average altitude
+
+#function: scores all unique candidate places of an airport against every path in one pass and assigns them to paths
+#parameters: places - list of dictionaries, lines - list of dictionaries, iataCode - string, search_distance_miles - float, all_paths - bool
+#returns: a list of spots in JSON format, one for each place and its best path, or one for each place and every qualifying path if all_paths is True
+def scorePlaces(places, lines, iataCode, search_distance_miles=0.3, all_paths=False):
+    unique_places = list({placeKey(place): place for place in places}.values()) #remove places found by more than one search
+    if len(unique_places) == 0 or len(lines) == 0: #if there is nothing to score
+        return []
+
+    place_coords = np.array([(place['location']['latitude'], place['location']['longitude']) for place in unique_places], dtype=np.float64) #coordinates of each place
+    distance_matrix = np.stack([nearestPoints(line['model'], place_coords)[0] for line in lines], axis=1) #distance from each place to each path
+
+    qualifying = distance_matrix <= search_distance_miles #places close enough to each path
+    if not all_paths: #if each place only gets its best path
+        best = np.argmin(distance_matrix, axis=1) #closest path of each place
+        best_only = np.zeros_like(qualifying)
+        best_only[np.arange(len(unique_places)), best] = True
+        qualifying &= best_only #keep only the closest path
+
+    altitude_matrix = np.full(distance_matrix.shape, np.nan) #average altitude for each place and path
+    for line_index, line in enumerate(lines): #for each path
+        rows = np.nonzero(qualifying[:, line_index])[0] #places assigned to this path
+        if len(rows): #if there are any
+            altitude_matrix[rows, line_index] = getAverageAltitudes(place_coords[rows], line['cluster'], search_distance_miles) #average altitude along this path
+
+    airport_coords = findAirportCoordinatesByIATACode(iataCode) #get the airport coordinates once
+    airport_distances = haversineMatrix(place_coords[:, 0], place_coords[:, 1], np.array([airport_coords[0]]), np.array([airport_coords[1]]))[:, 0] #distance from each place to the airport
+
+    spots = []
+    for place_index, line_index in zip(*np.nonzero(qualifying)): #for each place and assigned path
+        place = dict(unique_places[place_index]) #copy the place
+        place['airport'] = iataCode
+        place['distanceFromFlightpath'] = float(distance_matrix[place_index, line_index]) #add the distance from the line
+        place['averageAltitude'] = float(altitude_matrix[place_index, line_index]) #add the average altitude
+        place['distanceFromAirport'] = float(airport_distances[place_index]) #add the distance from the airport
+        place['path_id'] = iataCode + str(line_index) #add the path the place belongs to
+        spots.append(json.dumps(place))
+    return spots
+
+#function: takes a line and gets all the parks around it
+#parameters: line - dictionary
+#returns: a list of parks
+def getParks(line):
+    iataCode = str(line['cluster']['airport'].iloc[0]) #get the airport of the line
+    spots = [json.loads(spot) for spot in scorePlaces(searchParks(line), [line], iataCode)] #score the parks against the line
+    for spot in spots: #for each spot
+        del spot['path_id'] #a single line has no path id
+    return [json.dumps(spot) for spot in spots] #return spots
 
 if __name__ == "__main__" : 
-    # line = {'coefficients': [
-    #                         -9.22938759e-38,  4.52344752e-36,  5.70188403e-35, -5.79837247e-32,
-    #                         1.07988142e-29, -1.50839844e-27,  1.80310851e-25, -1.88840821e-23,
-    #                         1.67769043e-21, -1.07913069e-19,  6.90380855e-20,  1.59935028e-15,
-    #                         -3.74281769e-13,  6.31994481e-11, -9.04520499e-09,  1.13394089e-06,
-    #                         -1.21667264e-04,  9.80017965e-03, -1.48811402e-01, -1.70155669e+02,
-    #                         5.21074952e+04], 
-    #         'max_lat': 37.70220373244956, 
-    #         'max_long': -122.248742, 
-    #         'min_lat': 37.63234887950239, 
-    #         'min_long': -122.370055}
-    
-    line = {'coefficients': [
-                            -3.03918804e-30, -7.01339284e-32, 9.51372530e-27, -9.77640864e-25,
-                            6.81489730e-23, -3.46681640e-21, 8.53900410e-20, 7.63965073e-18,
-                            -1.50905591e-15, 1.63105937e-13, -1.38283618e-11, 9.68917112e-10,
-                            -5.32328856e-08, 1.59605029e-06, 1.07270076e-04, -2.57685970e-02,
-                            3.00784756e+00, -2.56326012e+02, 1.48160608e+04, 6.86667340e+02,
-                            -1.67431174e+08
-                            ],
-            'max_lat': 38.98708, 
-            'max_long': -77.039417, 
-            'min_lat': 38.867844, 
-            'min_long': -77.17926}
+    coefficients = [
+                    -3.03918804e-30, -7.01339284e-32, 9.51372530e-27, -9.77640864e-25,
+                    6.81489730e-23, -3.46681640e-21, 8.53900410e-20, 7.63965073e-18,
+                    -1.50905591e-15, 1.63105937e-13, -1.38283618e-11, 9.68917112e-10,
+                    -5.32328856e-08, 1.59605029e-06, 1.07270076e-04, -2.57685970e-02,
+                    3.00784756e+00, -2.56326012e+02, 1.48160608e+04, 6.86667340e+02,
+                    -1.67431174e+08
+                    ] #an older polynomial line at DCA
+    longs = np.linspace(-77.17926, -77.039417, 2000) #sample it densely
+    cluster_df = pd.read_csv("data/flightData/data/flight_log_DCA.csv") #planes used for the average altitude
+    cluster_df['airport'] = 'DCA'
+
+    line = {'model': buildPathModel(np.polyval(coefficients, longs), longs, 'polynomial'), 
+            'cluster': cluster_df}
     
     spots = getParks(line)
     print(spots)
-
-